@@ -0,0 +1,161 @@
+# Benchmark suite for the SEIRD solver, sweep and plotting paths
+#
+# Usage: python benchmarks/bench_seird.py [--quick] [--out results.json] [--compare previous.json]
+#
+# Every function named time_* is one benchmark. Each is run `repeat` times after a warm-up
+# run, and the min/median/max wall times are written as JSON, together with the git commit
+# and library versions, so results from different versions can be compared.
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import numpy as np
+import scipy
+from scipy.integrate import odeint
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from seird import simulate
+from seird_batch import batch_odeint
+from seird_stream import stream
+from seird_sweep import sweep, latin_hypercube
+from seird_plot import plotseird
+from seird_utils import deriv, beta, rhs, logistic_R_0, fold_policies, POLICIES
+
+N = 1000000.0
+t = np.linspace(0, 99, 100)
+y0 = np.array([N - 1, 1, 0, 0, 0])
+x0, R_0_end = fold_policies(6.0, 30.0, 6.0, POLICIES.values())
+rhs_args = (N, 0.25, 0.2, 0.3, 1 / 9, 6.0, 1.0, x0, R_0_end)
+
+# sizes of the larger benchmarks; --quick shrinks them for a smoke run
+SIZES = {'sweep_small': 1000, 'sweep_large': 10000, 'long_horizon_days': 3 * 365}
+QUICK_SIZES = {'sweep_small': 100, 'sweep_large': 1000, 'long_horizon_days': 365}
+
+def _sweep_samples(n):
+    return latin_hypercube({'alpha': (0.0, 1.0), 'gamma': (1 / 14, 1 / 2), 'R_0_end': (0.5, 6.0)}, n, seed=0)
+
+def time_logistic_R_0(sizes):
+    for day in range(100):
+        logistic_R_0(day, 6.0, 1.0, 30.0, 4.3)
+
+def time_deriv(sizes):
+    for day in range(100):
+        deriv(y0, day, N, beta, 0.25, 0.2, 0.3, 1 / 9, 6.0, 1.0, 30.0, 4.3)
+
+def time_rhs(sizes):
+    for day in range(100):
+        rhs(y0, day, *rhs_args)
+
+def time_odeint_deriv(sizes):
+    odeint(deriv, y0, t, args=(N, beta, 0.25, 0.2, 0.3, 1 / 9, 6.0, 1.0, 30.0, 4.3))
+
+def time_simulate(sizes):
+    simulate({'policies': list(POLICIES)})
+
+def time_batch_1k(sizes):
+    samples = _sweep_samples(sizes['sweep_small'])
+    batch_odeint(y0, t, N, samples['gamma'], 0.2, samples['alpha'], 1 / 9, 6.0, 1.0, 30.0, samples['R_0_end'])
+
+def time_batch_10k(sizes):
+    samples = _sweep_samples(sizes['sweep_large'])
+    batch_odeint(y0, t, N, samples['gamma'], 0.2, samples['alpha'], 1 / 9, 6.0, 1.0, 30.0, samples['R_0_end'])
+
+def time_sweep_10k(sizes):
+    sweep(_sweep_samples(sizes['sweep_large']), t, chunk_size=1000)
+
+def time_long_horizon_hourly(sizes):
+    for _ in stream({'days': sizes['long_horizon_days']}, step=1 / 24):
+        pass
+
+def time_plotseird(sizes):
+    result = simulate({})
+    plotseird(result['t'], result['S'], result['E'], result['I'], result['R'], result['D'], R0=result['R0'])
+    plt.close('all')
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run(names=None, repeat=5, quick=False):
+    """Runs the benchmarks and returns their timings as a JSON-serializable dict.
+
+    Parameters
+    ----------
+    names : list of str
+        Benchmarks to run (all time_* functions if None)
+
+    repeat : int
+        Number of timed runs per benchmark
+
+    quick : bool
+        Use smaller problem sizes
+
+    Returns
+    ----------
+    dict
+        Environment info and, per benchmark, the min/median/max wall time in seconds
+    """
+    sizes = QUICK_SIZES if quick else SIZES
+    benchmarks = {name: func for name, func in globals().items() if name.startswith('time_')}
+    if names:
+        benchmarks = {name: benchmarks[name] for name in names}
+    results = {}
+    for name, func in benchmarks.items():
+        func(sizes) # warm-up
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(sizes)
+            times.append(time.perf_counter() - start)
+        results[name] = {'min': min(times), 'median': float(np.median(times)), 'max': max(times), 'repeat': repeat}
+        print('{:<28s} {:10.4f} s'.format(name, results[name]['median']), file=sys.stderr)
+    return {
+        'commit': _git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'matplotlib': matplotlib.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'quick': quick,
+        'sizes': sizes,
+        'benchmarks': results,
+    }
+
+def compare(report, previous):
+    """Prints how each benchmark's median time changed relative to an earlier report."""
+    for name, result in report['benchmarks'].items():
+        if name in previous['benchmarks']:
+            ratio = result['median'] / previous['benchmarks'][name]['median']
+            flag = '  SLOWER' if ratio > 1.1 else ''
+            print('{:<28s} {:6.2f}x{}'.format(name, ratio, flag), file=sys.stderr)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SEIRD benchmark suite')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('--quick', action='store_true', help='use smaller problem sizes')
+    parser.add_argument('--out', help='JSON file to write the results to (default: stdout)')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+    report = run(args.names, args.repeat, args.quick)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
@@ -1,107 +1,28 @@
 # import necessary libraries
-from scipy.integrate import odeint
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from tkinter import *
 from seird_utils import *
+from seird import simulate
+from seird_cache import ScenarioCache
+from seird_plot import draw_seird, draw_series
+from seird_metrics import cfr, effective_R
 
 # configure the application dashboard settings
 root = Tk()
 root.title('Create your own SEIRD Model for COVID-19')
 root.geometry('2000x2000')
 
-def plotseird(t, S, E, I, R, D=None, L=None, R0=None, Alpha=None, CFR=None):
-    """ Performs necessary plotting for SEIRD model parameters. 
+# re-running a scenario the user already generated returns the cached result
+cache = ScenarioCache()
 
-    Parameters
-    ----------
-    t : int
-        Time (days)
-    S : int
-        Number of susceptible individuals at time t
-    E : int
-        Number of exposed individuals at time t
-    I : int
-        Number of infected individuals at time t
-    R : int
-        Number of recovered individuals at time t
-    D : int
-        Number of deceased individuals at time t
-    R0 : float
-        Basic reproduction number 
-    Alpha : float
-        Fatality rate
-    CFR : float
-        Case Fatality Rate (CFR) - the total number of deaths as a proportion of reported cases at time t
-
-    Returns
-    -------
-    None
-        Plots SEIRD Graph
-
-    Code sourced from https://towardsdatascience.com/infectious-disease-modelling-part-i-understanding-sir-28d60e29fdfc  
-    """
-    f, ax = plt.subplots(1,1,figsize=(10,4))
-    ax.plot(t, S, 'b', alpha=0.7, linewidth=2, label='Susceptible')
-    ax.plot(t, E, 'y', alpha=0.7, linewidth=2, label='Exposed')
-    ax.plot(t, I, 'r', alpha=0.7, linewidth=2, label='Infected')
-    ax.plot(t, R, 'g', alpha=0.7, linewidth=2, label='Recovered')
-    if D is not None:
-        ax.plot(t, D, 'k', alpha=0.7, linewidth=2, label='Dead')
-        ax.plot(t, S+E+I+R+D, 'c--', alpha=0.7, linewidth=2, label='Total')
-    else:
-        ax.plot(t, S+E+I+R, 'c--', alpha=0.7, linewidth=2, label='Total')
-
-    ax.set_xlabel('Time (days)')
-    ax.set_ylabel('Number of People')
-
-    ax.yaxis.set_tick_params(length=0)
-    ax.xaxis.set_tick_params(length=0)
-    ax.grid(b=True, which='major', c='w', lw=2, ls='-')
-    legend = ax.legend(borderpad=2.0)
-    legend.get_frame().set_alpha(0.5)
-    for spine in ('top', 'right', 'bottom', 'left'):
-        ax.spines[spine].set_visible(False)
-    if L is not None:
-        plt.title("Lockdown after {} days".format(L))
-    plt.show();
-
-    if R0 is not None or CFR is not None:
-        f = plt.figure(figsize=(12,4))
-
-    if R0 is not None:
-        # sp1
-        ax1 = f.add_subplot(121)
-        ax1.plot(t, R0, 'b--', alpha=0.7, linewidth=2, label='R_0')
-
-        ax1.set_xlabel('Time (days)')
-        ax1.title.set_text('R_0 over time')
-        
-        ax1.yaxis.set_tick_params(length=0)
-        ax1.xaxis.set_tick_params(length=0)
-        ax1.grid(b=True, which='major', c='w', lw=2, ls='-')
-        legend = ax1.legend()
-        legend.get_frame().set_alpha(0.5)
-        for spine in ('top', 'right', 'bottom', 'left'):
-            ax.spines[spine].set_visible(False)
-
-    if Alpha is not None:
-        # sp2
-        ax2 = f.add_subplot(122)
-        ax2.plot(t, Alpha, 'r--', alpha=0.7, linewidth=2, label='alpha')
-
-        ax2.set_xlabel('Time (days)')
-        ax2.title.set_text('fatality rate over time')
-        
-        ax2.yaxis.set_tick_params(length=0)
-        ax2.xaxis.set_tick_params(length=0)
-        ax2.grid(b=True, which='major', c='w', lw=2, ls='-')
-        legend = ax2.legend()
-        legend.get_frame().set_alpha(0.5)
-        for spine in ('top', 'right', 'bottom', 'left'):
-            ax.spines[spine].set_visible(False)
-
-        plt.show()
+# simulations run on a background thread so the window stays responsive;
+# each click gets a job number and only the latest job's result is drawn
+executor = ThreadPoolExecutor(max_workers=1)
+latest_job = 0
+queued_future = None
 
 # setting global variables 
 D = 4.0 # CONTAGIOUS PERIOD; DEFAULT: infections lasts four days
@@ -128,16 +49,11 @@ incubationtimeinput.insert(0, 5)
 infectiontodeathinput = Entry(root, width=75)
 infectiontodeathinput.insert(0, 9)
 
-businesses_var = IntVar()
-businesses = Checkbutton(root, text="Close non-essential businesses", variable =businesses_var)
-schools_var = IntVar()
-schools = Checkbutton(root, text="Close schools and universities", variable =schools_var)
-quarantine_var = IntVar()
-quarantine = Checkbutton(root, text="Stay at home orders (quarantine)", variable =quarantine_var)
-testing_var = IntVar()
-testing = Checkbutton(root, text="Aggressive testing", variable =testing_var)
-travel_var = IntVar()
-travel = Checkbutton(root, text="Travel ban", variable =travel_var)
+policy_vars = {}
+policy_checkboxes = {}
+for key, policy in POLICIES.items():
+    policy_vars[key] = IntVar()
+    policy_checkboxes[key] = Checkbutton(root, text=policy.name, variable=policy_vars[key])
 
 # configuring arrangement of text boxes for user interface
 
@@ -146,16 +62,38 @@ mortalityrateinput.grid(row=1, column=1)
 contagiousperiodinput.grid(row=2, column=1)
 incubationtimeinput.grid(row=3, column=1)
 infectiontodeathinput.grid(row=4, column=1)
-businesses.grid(row=6, column=0)
-schools.grid(row=7,column=0)
-quarantine.grid(row=8,column=0)
-testing.grid(row=9, column=0)
-travel.grid(row=10, column=0)
+for row, checkbox in enumerate(policy_checkboxes.values(), start=6):
+    checkbox.grid(row=row, column=0)
+
+
+# charts are embedded in the window and redrawn in place
+figure = Figure(figsize=(12, 8))
+seird_axes = figure.add_subplot(211)
+R0_axes = figure.add_subplot(223)
+CFR_axes = figure.add_subplot(224)
+figure.tight_layout()
+canvas = FigureCanvasTkAgg(figure, master=root)
+canvas.get_tk_widget().grid(row=16, column=0, columnspan=2)
+status = Label(root, text='', font=(None, 15))
+status.grid(row=15, column=0)
+
+# chart lines kept between runs, so live updates only move them (see `blitgraph`)
+seird_lines = []
+series_lines = [] # R0, R_t and CFR
+background = None
+
+# live mode: re-simulate whenever an input changes, debounced by LIVE_DELAY ms
+LIVE_DELAY = 30
+live_after = None
+live_var = IntVar()
 
 
 def buildgraph():
     """ Builds a SEIRD model based on the inputs given in the tkinter entries above 
 
+    The simulation runs on a background thread. Clicking again before it finishes
+    drops any run that hasn't started yet, and only the latest run gets drawn.
+
     Parameters
     -------
     None
@@ -163,88 +101,210 @@ def buildgraph():
     Returns
     -------
     None
-        Calls function to plots SEIRD Graph
+        Schedules the SEIRD graph to be drawn once the simulation finishes
 
     """
+    global latest_job, queued_future
 
     # grab the necessary user inputs from the text boxes
-    N = float(populationinput.get())
-    alpha = float(mortalityrateinput.get())
-    D = float(contagiousperiodinput.get())
-    gamma = 1.0 / D
-    delta = 1/float(incubationtimeinput.get())
-    rho = 1/float(infectiontodeathinput.get())
-    S0, E0, I0, R0, D0 = N-1, 1, 0, 0, 0
-    t = np.linspace(0, 99, 100) # Grid of time points (in days)
-    y0 = S0, E0, I0, R0, D0 # Initial conditions vector
-    R_0_start, k, x0, R_0_end = 6.0, 1, 30, 6.0 # initial R0 Values
-    policy_implemented = False
+    params = {
+        'population': float(populationinput.get()),
+        'mortality_rate': float(mortalityrateinput.get()),
+        'contagious_period': float(contagiousperiodinput.get()),
+        'incubation_time': float(incubationtimeinput.get()),
+        'infection_to_death': float(infectiontodeathinput.get()),
+        'R_0_start': 6.0, 'k': 1, 'x0': 30, 'R_0_end': 6.0, # initial R0 Values
+        'policies': [key for key, var in policy_vars.items() if var.get()],
+    }
+
+    # a run that is still waiting for the worker is stale now
+    if queued_future is not None:
+        queued_future.cancel()
+    latest_job += 1
+    queued_future = executor.submit(simulate, params, cache)
+    status.config(text='Simulating...')
+    root.after(20, collectgraph, queued_future, latest_job)
+
+
+def collectgraph(future, job):
+    """ Polls a background simulation from the Tk event loop and draws its result.
 
-    # apply special conditions, if specified by user
-    if businesses_var.get():
-        policy_implemented = True
-        R_0_end = less_than_zero(R_0_end, 0.5)
+    Parameters
+    -------
+    future : concurrent.futures.Future
+        The running simulation
+    job : int
+        Job number the simulation was started with
 
-        # Integrate the SIR equations over the time grid, t:
-        ret = odeint(deriv, y0, t, args=(N, beta, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end))
+    Returns
+    -------
+    None
+    """
+    if job != latest_job or future.cancelled():
+        return
+    if not future.done():
+        root.after(20, collectgraph, future, job)
+        return
+    try:
+        result = future.result()
+    except Exception as e:
+        status.config(text='Error: {}'.format(e))
+        return
+    status.config(text='')
+
+    if canblit(result):
+        blitgraph(result)
+    else:
+        redrawgraph(result)
 
-        S, E, I, R, D = ret.T
-        R0_over_time = [logistic_R_0(i, R_0_start, k, x0, R_0_end) for i in range(len(t))]
 
-    if schools_var.get():
-        policy_implemented = True
-        R_0_end = less_than_zero(R_0_end, 0.1)
+def redrawgraph(result):
+    """ Rebuilds the embedded charts from scratch (new axes limits, legend, etc.)
 
-        # Integrate the SIR equations over the time grid, t:
-        ret = odeint(deriv, y0, t, args=(N, beta, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end))
+    Parameters
+    -------
+    result : dict
+        Output of `simulate`
 
-        S, E, I, R, D = ret.T
-        R0_over_time = [logistic_R_0(i, R_0_start, k, x0, R_0_end) for i in range(len(t))]
+    Returns
+    -------
+    None
+    """
+    seird_axes.clear()
+    R0_axes.clear()
+    CFR_axes.clear()
+    seird_lines[:] = draw_seird(seird_axes, result['t'], result['S'], result['E'], result['I'], result['R'], result['D'])
+    R0, R_t, CFR = seriesvalues(result)
+    series_lines[:] = [
+        draw_series(R0_axes, result['t'], R0, 'b--', 'R_0', 'R_0 over time'),
+        draw_series(R0_axes, result['t'], R_t, 'g-', 'R_t', 'R_0 and effective R_t over time'),
+        draw_series(CFR_axes, result['t'], CFR, 'k-', 'CFR', 'Case fatality rate over time'),
+    ]
+    # the lines are drawn by `blitgraph`/`ondraw` on top of a cached background
+    for line in seird_lines + series_lines:
+        line.set_animated(True)
+    canvas.draw()
+
+
+def seriesvalues(result):
+    """ Computes the series shown below the SEIRD chart.
 
-    if quarantine_var.get():
-        policy_implemented = True
-        R_0_end = less_than_zero(R_0_end, 0.4)
+    Parameters
+    -------
+    result : dict
+        Output of `simulate`
 
-        # Integrate the SIR equations over the time grid, t:
-        ret = odeint(deriv, y0, t, args=(N, beta, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end))
+    Returns
+    -------
+    tuple of numpy.ndarray
+        R0, effective R_t and case fatality rate over time
+    """
+    ret = np.stack([result['S'], result['E'], result['I'], result['R'], result['D']], axis=-1)
+    return result['R0'], effective_R(ret, result['R0']), cfr(ret)
 
-        S, E, I, R, D = ret.T
-        R0_over_time = [logistic_R_0(i, R_0_start, k, x0, R_0_end) for i in range(len(t))]
 
-    if testing_var.get():
-        policy_implemented = True
-        R_0_end = less_than_zero(R_0_end, 0.5)
+def canblit(result):
+    """ Checks whether a result can be drawn by updating the existing lines.
 
-        # Integrate the SIR equations over the time grid, t:
-        ret = odeint(deriv, y0, t, args=(N, beta, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end))
+    That is the case when the time grid is unchanged and the new curves still fit
+    the current axes, without the SEIRD curves shrinking to less than half the plot.
 
-        S, E, I, R, D = ret.T
-        R0_over_time = [logistic_R_0(i, R_0_start, k, x0, R_0_end) for i in range(len(t))]
+    Parameters
+    -------
+    result : dict
+        Output of `simulate`
 
-    if travel_var.get():
-        policy_implemented = True
-        R_0_end = less_than_zero(R_0_end, 0.2)
+    Returns
+    -------
+    bool
+    """
+    if background is None or not series_lines or len(series_lines[0].get_xdata()) != len(result['t']):
+        return False
+    _, top = seird_axes.get_ylim()
+    high = (result['S'] + result['E'] + result['I'] + result['R'] + result['D']).max()
+    if high > top or high < 0.5 * top:
+        return False
+    for line, values in zip(series_lines, seriesvalues(result)):
+        bottom, top = line.axes.get_ylim()
+        if values.min() < bottom or values.max() > top:
+            return False
+    return True
+
+
+def blitgraph(result):
+    """ Updates the existing chart lines in place and blits only them onto the canvas.
 
-        # Integrate the SIR equations over the time grid, t:
-        ret = odeint(deriv, y0, t, args=(N, beta, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end))
+    Parameters
+    -------
+    result : dict
+        Output of `simulate`
+
+    Returns
+    -------
+    None
+    """
+    total = result['S'] + result['E'] + result['I'] + result['R'] + result['D']
+    for line, values in zip(seird_lines, (result['S'], result['E'], result['I'], result['R'], result['D'], total)):
+        line.set_ydata(values)
+    for line, values in zip(series_lines, seriesvalues(result)):
+        line.set_ydata(values)
+    canvas.restore_region(background)
+    drawlines()
+    canvas.blit(figure.bbox)
+
+
+def drawlines():
+    """ Draws the animated chart lines onto the canvas renderer. """
+    for line in seird_lines + series_lines:
+        line.axes.draw_artist(line)
 
-        S, E, I, R, D = ret.T
-        R0_over_time = [logistic_R_0(i, R_0_start, k, x0, R_0_end) for i in range(len(t))]
 
-    if not policy_implemented:
-        R_0_start, k, x0, R_0_end = 6.0, 1, 70, 6.0
+def ondraw(event):
+    """ Caches the chart background after every full redraw (including window resizes). """
+    global background
+    background = canvas.copy_from_bbox(figure.bbox)
+    if series_lines:
+        drawlines()
 
-        # Integrate the SIR equations over the time grid, t:
-        ret = odeint(deriv, y0, t, args=(N, beta, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end))
 
-        S, E, I, R, D = ret.T
-        R0_over_time = [logistic_R_0(i, R_0_start, k, x0, R_0_end) for i in range(len(t))]
+def scheduleliveupdate(*args):
+    """ Re-simulates shortly after an input changes, if live mode is on.
+
+    Changes arriving within LIVE_DELAY ms of each other (e.g. while dragging a
+    slider) are coalesced into a single run.
+
+    Returns
+    -------
+    None
+    """
+    global live_after
+    if not live_var.get():
+        return
+    if live_after is not None:
+        root.after_cancel(live_after)
+    live_after = root.after(LIVE_DELAY, liveupdate)
+
+
+def liveupdate():
+    """ Runs a live re-simulation, quietly skipping inputs that are half typed. """
+    global live_after
+    live_after = None
+    try:
+        buildgraph()
+    except ValueError:
+        status.config(text='Waiting for valid input...')
+
+canvas.mpl_connect('draw_event', ondraw)
+Checkbutton(root, text='Live update', variable=live_var, command=scheduleliveupdate).grid(row=14, column=1)
+mortalityrateinput.config(command=scheduleliveupdate)
+for entry in (populationinput, contagiousperiodinput, incubationtimeinput, infectiontodeathinput):
+    entry.bind('<KeyRelease>', scheduleliveupdate)
+for checkbox in policy_checkboxes.values():
+    checkbox.config(command=scheduleliveupdate)
 
-    # call plotting function 
-    plotseird(t, S, E, I, R, D, R0=R0_over_time)
-    
 
 GenerateGraphButton = Button(root, text='Generate Graph', command = buildgraph)
 GenerateGraphButton.grid(row=15, column=1)
 
 root.mainloop()
+executor.shutdown(wait=False, cancel_futures=True)
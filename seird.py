@@ -0,0 +1,201 @@
+# Headless SEIRD simulation API and command line entry point
+#
+# Usage: python -m seird run --config scenario.json --out results.npz
+#
+# Nothing in here imports tkinter or matplotlib, so it can run on servers without a display.
+import argparse
+import json
+import numpy as np
+from seird_cache import scenario_key
+from seird_profile import phase
+from seird_schedules import LogisticSchedule, make_schedule
+from seird_solvers import solve, METHODS
+from seird_utils import table_rhs, table_jac, Policy, POLICIES
+
+# default scenario, matching the dashboard defaults
+DEFAULT_PARAMS = {
+    'population': 1000000,
+    'mortality_rate': 0.3,
+    'contagious_period': 4.0,
+    'incubation_time': 5.0,
+    'infection_to_death': 9.0,
+    'R_0_start': 6.0,
+    'k': 1.0,
+    'x0': 30.0,
+    'R_0_end': 6.0,
+    'days': 100,
+    'policies': [],
+    'R0_schedule': None,
+}
+
+def make_policy(spec):
+    """Looks up a policy given by name in POLICIES, or builds one from a dict/Policy."""
+    if isinstance(spec, Policy):
+        return spec
+    if isinstance(spec, dict):
+        return Policy(spec['name'], float(spec['decrement']), float(spec['onset']))
+    if spec not in POLICIES:
+        raise ValueError('Unknown policy: {} (choose from {})'.format(spec, ', '.join(POLICIES)))
+    return POLICIES[spec]
+
+def scenario_params(params):
+    """Fills in DEFAULT_PARAMS for any setting missing from params; raises ValueError for unknown keys."""
+    unknown = set(params) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError('Unknown scenario parameter(s): {}'.format(', '.join(sorted(unknown))))
+    return dict(DEFAULT_PARAMS, **params)
+
+def scenario_schedule(params):
+    """Builds the R0 schedule of a scenario, with its selected policies folded in (so we only integrate once)."""
+    p = scenario_params(params)
+    k = float(p['k'])
+    policies = [make_policy(spec) for spec in p['policies']]
+    if p['R0_schedule'] is None:
+        schedule = LogisticSchedule(p['R_0_start'], k, p['x0'], p['R_0_end'])
+    else:
+        schedule = make_schedule(p['R0_schedule'])
+    return schedule.with_policies(policies, k)
+
+def scenario_args(params):
+    """Turns scenario settings into the initial conditions and arguments of `seird_utils.table_rhs`.
+
+    Parameters
+    ----------
+    params : dict
+        Scenario settings, see `simulate`
+
+    Returns
+    -------
+    y0 : tuple
+        Initial S, E, I, R, D values
+
+    args : tuple
+        (N, gamma, delta, alpha, rho, t0, dt, R0_table), with the R0 schedule (and any
+        selected policies) precomputed once on a dense grid
+
+    days : int
+        Number of days to simulate
+
+    schedule : seird_schedules.R0Schedule
+        The R0 schedule, with the selected policies applied
+    """
+    p = scenario_params(params)
+
+    N = float(p['population'])
+    alpha = float(p['mortality_rate'])
+    gamma = 1.0 / float(p['contagious_period'])
+    delta = 1.0 / float(p['incubation_time'])
+    rho = 1.0 / float(p['infection_to_death'])
+    y0 = N-1, 1, 0, 0, 0 # Initial conditions vector
+    schedule = scenario_schedule(p)
+    t0, dt, R0_table = schedule.tabulate(0 if p['days'] is None else p['days'])
+    return y0, (N, gamma, delta, alpha, rho, t0, dt, R0_table), p['days'], schedule
+
+def _settings_key(params, points_per_day, solver):
+    """Cache key of a scenario computed from its settings, without tabulating its R0 schedule.
+
+    Returns None for scenarios with a custom R0_schedule, which can only be keyed on
+    their tabulated R0 curve.
+    """
+    p = scenario_params(params)
+    if p['R0_schedule'] is not None:
+        return None
+    policies = [make_policy(spec) for spec in p['policies']]
+    settings = [float(p[name]) for name in DEFAULT_PARAMS if name not in ('policies', 'R0_schedule')]
+    # the policy names don't change the result, only their decrements and onsets
+    return scenario_key(settings, np.array([(policy.decrement, policy.onset) for policy in policies], dtype=float).reshape(-1, 2),
+                        points_per_day, *solver)
+
+def simulate(params, cache=None, method='odeint', rtol=None, atol=None, points_per_day=1):
+    """Runs a single SEIRD scenario.
+
+    Parameters
+    ----------
+    params : dict
+        Scenario settings. Any key missing from DEFAULT_PARAMS is filled in with its default:
+
+        population : Population size (N)
+        mortality_rate : Fatality rate (alpha)
+        contagious_period : Contagious period in days (gamma = 1/contagious_period)
+        incubation_time : Incubation time in days (delta = 1/incubation_time)
+        infection_to_death : Days from infection to death (rho = 1/infection_to_death)
+        R_0_start, k, x0, R_0_end : Logistic R0 curve, see `seird_utils.logistic_R_0`
+        days : Number of days to simulate
+        policies : Policies to implement, each either a key of `seird_utils.POLICIES`
+            or a dict with 'name', 'decrement' and 'onset'
+        R0_schedule : Optional `seird_schedules.R0Schedule`, or a config dict for
+            `seird_schedules.make_schedule`, replacing the logistic R0 curve
+            (policies still apply on top of it, phased in with steepness k)
+
+    cache : seird_cache.ScenarioCache
+        Optional cache to look the scenario up in (and store it in on a miss)
+
+    method : str
+        Solver backend, see `seird_solvers.solve`
+
+    rtol, atol : float
+        Solver tolerances (backend defaults if None)
+
+    points_per_day : int
+        Number of output points per day
+
+    Returns
+    -------
+    dict
+        Arrays 't', 'S', 'E', 'I', 'R', 'D' and 'R0' (R0 over time), one value per output point
+    """
+    if cache is not None:
+        if method != 'auto' and method not in METHODS:
+            raise ValueError('Unknown method: {} (choose from auto, {})'.format(method, ', '.join(METHODS)))
+        solver = METHODS.index(method) if method in METHODS else -1, rtol or 0, atol or 0
+        with phase('setup'):
+            key = _settings_key(params, points_per_day, solver)
+        if key is not None:
+            result = cache.get(key)
+            if result is not None:
+                return result
+
+    with phase('setup'):
+        y0, args, days, schedule = scenario_args(params)
+        t = np.linspace(0, days - 1, (int(days) - 1) * points_per_day + 1) # Grid of time points (in days)
+
+    if cache is not None and key is None:
+        # custom schedules are keyed on their tabulated R0 curve
+        key = scenario_key(y0, t, *args, *solver)
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    # Integrate the SEIRD equations over the time grid, t:
+    with phase('integrate'):
+        ret = solve(table_rhs, y0, t, args=args, method=method, rtol=rtol, atol=atol, jac=table_jac).y
+
+    with phase('post-process'):
+        S, E, I, R, D = ret.T
+        R0_over_time = schedule(t)
+        result = {'t': t, 'S': S, 'E': E, 'I': I, 'R': R, 'D': D, 'R0': R0_over_time}
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(prog='python -m seird', description='Headless SEIRD model runner')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='simulate a single scenario')
+    run_parser.add_argument('--config', help='JSON file with scenario parameters (defaults are used if omitted)')
+    run_parser.add_argument('--out', required=True, help='output .npz file')
+    args = parser.parse_args(argv)
+
+    params = {}
+    if args.config:
+        with open(args.config) as f:
+            params = json.load(f)
+    try:
+        result = simulate(params)
+    except ValueError as e:
+        parser.error(str(e))
+    np.savez(args.out, **result)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# Age-structured SEIRD model with contact matrices
+import numpy as np
+from scipy.integrate import odeint
+from seird_schedules import LogisticSchedule
+from seird_utils import table_R_0
+
+def age_deriv(y, t, N, contacts, gamma, delta, alpha, rho, t0, dt, R0_table, k, contact_factors):
+    """Calculates the SEIRD derivatives for every age band.
+
+    The force of infection on band i is beta(t) * sum_j C[i, j] * I_j / N_j, where C is
+    the contact matrix scaled so that its dominant eigenvalue is 1; R0(t) then keeps its
+    usual meaning for the population as a whole. A policy that only affects some
+    contacts multiplies its block of C by a factor (see `close_contacts`).
+
+    Parameters
+    ----------
+    y : ndarray
+        Flattened (5, n_ages) matrix of current S, E, I, R, D values per age band
+
+    t : float
+        Time (days)
+
+    N : ndarray
+        Population of each age band
+
+    contacts : ndarray
+        (n_ages, n_ages) normalized contact matrix
+
+    gamma, delta : float
+        See `seird_utils.deriv`
+
+    alpha, rho : ndarray
+        Fatality rate and death rate of each age band
+
+    t0, dt, R0_table : float, float, ndarray
+        Precomputed R0 schedule, as returned by `R0Schedule.tabulate`
+
+    k : float
+        How quickly contact policies phase in around their onset day (as in `seird_utils.logistic_R_0`)
+
+    contact_factors : list of (float, ndarray)
+        (onset day, (n_ages, n_ages) factor matrix) per policy; once phased in, a
+        policy multiplies the contact matrix by its factors
+
+    Returns
+    ----------
+    dydt : ndarray
+        Flattened (5, n_ages) matrix of derivatives of S, E, I, R, D with respect to time
+    """
+    S, E, I = y.reshape(5, -1)[:3]
+    C = contacts
+    for onset, factors in contact_factors:
+        step = 1 / (1 + np.exp(min(-k * (t - onset), 700.0)))
+        C = C * (1 - (1 - factors) * step)
+    infections = table_R_0(t, t0, dt, R0_table) * gamma * S * (C @ (I / N))
+    dydt = np.empty((5, len(N)))
+    dydt[0] = -infections
+    dydt[1] = infections - delta * E
+    dydt[2] = delta * E - (1 - alpha) * gamma * I - alpha * rho * I
+    dydt[3] = (1 - alpha) * gamma * I
+    dydt[4] = alpha * rho * I
+    return dydt.ravel()
+
+def normalize_contacts(contacts):
+    """Scales a contact matrix so that its dominant eigenvalue is 1.
+
+    Parameters
+    ----------
+    contacts : ndarray
+        (n_ages, n_ages) matrix; contacts[i, j] is the average number of daily contacts
+        a person in band i has with people in band j
+
+    Returns
+    ----------
+    ndarray
+        The scaled matrix
+    """
+    contacts = np.asarray(contacts, dtype=float)
+    return contacts / np.max(np.abs(np.linalg.eigvals(contacts)))
+
+def close_contacts(n_ages, bands, factor, onset, between=None):
+    """Builds a policy that scales only some contact blocks, e.g. closing schools.
+
+    Parameters
+    ----------
+    n_ages : int
+        Number of age bands
+
+    bands : sequence of int
+        Age bands whose contacts are affected (e.g. the school-age bands)
+
+    factor : float
+        What remains of the affected contacts (0.3 means 70% fewer)
+
+    onset : float
+        Day around which the policy is phased in
+
+    between : sequence of int
+        Other side of the affected contacts; by default the policy only affects
+        contacts among `bands` themselves (e.g. pupils with pupils)
+
+    Returns
+    ----------
+    tuple
+        (onset, factor matrix), for the `contact_policies` argument of `age_odeint`
+    """
+    factors = np.ones((n_ages, n_ages))
+    other = bands if between is None else between
+    factors[np.ix_(bands, other)] = factor
+    factors[np.ix_(other, bands)] = factor
+    return float(onset), factors
+
+def age_odeint(y0, t, N, contacts, gamma, delta, alpha, rho, schedule=None, contact_policies=(), k=1.0):
+    """Integrates the age-structured SEIRD equations.
+
+    Parameters
+    ----------
+    y0 : ndarray
+        (n_ages, 5) matrix of initial S, E, I, R, D values per age band
+
+    t : ndarray
+        Grid of time points (in days)
+
+    N : ndarray
+        Population of each age band
+
+    contacts : ndarray
+        (n_ages, n_ages) contact matrix, normalized with `normalize_contacts`
+
+    gamma, delta : float
+        See `seird_utils.deriv`
+
+    alpha, rho : ndarray or float
+        Fatality rate and death rate, per age band or shared
+
+    schedule : seird_schedules.R0Schedule
+        Population-wide R0 over time (default: constant R0 of 6, as on the dashboard)
+
+    contact_policies : sequence of tuple
+        Age-specific policies, e.g. from `close_contacts`
+
+    k : float
+        How quickly contact policies phase in around their onset day
+
+    Returns
+    ----------
+    ret : ndarray
+        (n_ages, len(t), 5) array of S, E, I, R, D values per age band
+    """
+    N = np.asarray(N, dtype=float)
+    n_ages = len(N)
+    if schedule is None:
+        schedule = LogisticSchedule(6.0, 1.0, 30.0, 6.0)
+    t0, dt, R0_table = schedule.tabulate(t[-1])
+    alpha = np.broadcast_to(np.asarray(alpha, dtype=float), (n_ages,))
+    rho = np.broadcast_to(np.asarray(rho, dtype=float), (n_ages,))
+    args = (N, np.asarray(contacts, dtype=float), gamma, delta, alpha, rho, t0, dt, R0_table, k, list(contact_policies))
+    ret = odeint(age_deriv, np.asarray(y0, dtype=float).T.ravel(), t, args=args)
+    return ret.reshape(len(t), 5, n_ages).transpose(2, 0, 1)
@@ -0,0 +1,175 @@
+# Vectorized batch solver for running many SEIRD scenarios at once
+import numpy as np
+from seird_profile import counted, solver_info
+from seird_utils import logistic_R_0, table_R_0
+
+def batch_flows(y, infection_rate, gamma, delta, alpha, rho):
+    """Calculates the SEIRD derivatives of a batch of scenarios from their current infection rates.
+
+    The batch right hand sides differ only in where R0 comes from; they all end here.
+
+    Parameters
+    ----------
+    y : ndarray
+        (n_scenarios, 5) matrix of current S, E, I, R, D values
+
+    infection_rate : ndarray or float
+        beta / N = R0 * gamma / N per scenario, so that S * I * infection_rate people
+        are infected per day
+
+    gamma, delta, alpha, rho : ndarray or float
+        Per-scenario parameters of shape (n_scenarios,), or shared scalars. See
+        `seird_utils.deriv` for their meaning.
+
+    Returns
+    ----------
+    dydt : ndarray
+        (n_scenarios, 5) matrix of derivatives of S, E, I, R, D with respect to time
+    """
+    S, E, I = y[:, 0], y[:, 1], y[:, 2]
+    infections = infection_rate * S * I
+    recoveries = (1 - alpha) * gamma * I
+    deaths = alpha * rho * I
+    dydt = np.empty_like(y)
+    dydt[:, 0] = -infections
+    dydt[:, 1] = infections - delta * E
+    dydt[:, 2] = delta * E - recoveries - deaths
+    dydt[:, 3] = recoveries
+    dydt[:, 4] = deaths
+    return dydt
+
+def batch_deriv(y, t, N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end):
+    """Calculates the SEIRD derivatives for a whole batch of scenarios in one vectorized step.
+
+    Parameters
+    ----------
+    y : ndarray
+        (n_scenarios, 5) matrix of current S, E, I, R, D values
+
+    t : float
+        Time (days)
+
+    N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end : ndarray
+        Per-scenario parameters of shape (n_scenarios,), or scalars shared by
+        every scenario. See `seird_utils.deriv` for their meaning.
+
+    Returns
+    ----------
+    dydt : ndarray
+        (n_scenarios, 5) matrix of derivatives of S, E, I, R, D with respect to time
+    """
+    return batch_flows(y, logistic_R_0(t, R_0_start, k, x0, R_0_end) * gamma / N, gamma, delta, alpha, rho)
+
+def batch_table_deriv(y, t, N, gamma, delta, alpha, rho, t0, dt, R0_tables):
+    """Version of `batch_deriv` that reads each scenario's R0 from a precomputed table.
+
+    Parameters
+    ----------
+    y : ndarray
+        (n_scenarios, 5) matrix of current S, E, I, R, D values
+
+    t : float
+        Time (days)
+
+    N, gamma, delta, alpha, rho : ndarray
+        Per-scenario parameters of shape (n_scenarios,), or shared scalars
+
+    t0, dt : float
+        Grid shared by every table, as returned by `R0Schedule.tabulate`
+
+    R0_tables : ndarray
+        (n_points, n_scenarios) matrix with one R0 table per column; pad shorter
+        tables with their last value
+
+    Returns
+    ----------
+    dydt : ndarray
+        (n_scenarios, 5) matrix of derivatives of S, E, I, R, D with respect to time
+    """
+    return batch_flows(y, table_R_0(t, t0, dt, R0_tables) * gamma / N, gamma, delta, alpha, rho)
+
+def rk4_steps(func, y0, t, args=(), steps_per_day=10):
+    """Advances y0 over the time grid t with a fixed-step fourth order Runge-Kutta scheme.
+
+    Every interval of the grid is split into equal sub-steps so that there are at
+    least `steps_per_day` sub-steps per day. The state is yielded at each point of t,
+    so callers can store it wherever they like.
+
+    Parameters
+    ----------
+    func : callable
+        Right hand side, called as func(y, t, *args)
+
+    y0 : ndarray
+        Initial state at t[0]
+
+    t : ndarray
+        Grid of time points (in days)
+
+    args : tuple
+        Extra arguments passed on to func
+
+    steps_per_day : int
+        Minimum number of sub-steps per day
+
+    Yields
+    ----------
+    y : ndarray
+        State at each point of t (a fresh array every time)
+    """
+    y = np.array(y0, dtype=float)
+    yield y.copy()
+    for t_start, t_stop in zip(t[:-1], t[1:]):
+        n_steps = max(1, int(np.ceil((t_stop - t_start) * steps_per_day)))
+        h = (t_stop - t_start) / n_steps
+        for step in range(n_steps):
+            s = t_start + step * h
+            k1 = func(y, s, *args)
+            k2 = func(y + 0.5 * h * k1, s + 0.5 * h, *args)
+            k3 = func(y + 0.5 * h * k2, s + 0.5 * h, *args)
+            k4 = func(y + h * k3, s + h, *args)
+            y = y + h / 6.0 * (k1 + 2 * k2 + 2 * k3 + k4)
+        yield y.copy()
+
+def batch_odeint(y0, t, N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end, steps_per_day=10):
+    """Integrates the SEIRD equations for many parameter sets at once.
+
+    All scenarios are advanced together as one (n_scenarios, 5) state matrix, so a
+    sweep over thousands of parameter sets costs a few thousand vectorized RHS
+    evaluations instead of thousands of separate `odeint` calls.
+
+    Parameters
+    ----------
+    y0 : ndarray
+        Initial S, E, I, R, D values, either shape (5,) shared by every scenario
+        or shape (n_scenarios, 5)
+
+    t : ndarray
+        Grid of time points (in days)
+
+    N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end : ndarray or float
+        Per-scenario parameters of shape (n_scenarios,), or scalars shared by
+        every scenario. See `seird_utils.deriv` for their meaning.
+
+    steps_per_day : int
+        Minimum number of RK4 sub-steps per day
+
+    Returns
+    ----------
+    ret : ndarray
+        (n_scenarios, len(t), 5) array of S, E, I, R, D values
+    """
+    params = np.broadcast_arrays(*[np.asarray(p, dtype=float) for p in
+                                   (N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end)])
+    y0 = np.asarray(y0, dtype=float)
+    n_scenarios = np.broadcast_shapes(params[0].shape, y0.shape[:-1], (1,))[0]
+    params = [np.broadcast_to(p, (n_scenarios,)) for p in params]
+    y0 = np.broadcast_to(y0, (n_scenarios, 5))
+    t = np.asarray(t, dtype=float)
+
+    ret = np.empty((n_scenarios, len(t), 5))
+    for i, y in enumerate(rk4_steps(counted(batch_deriv, 'rhs'), y0, t, params, steps_per_day)):
+        ret[:, i, :] = y
+    n_steps = sum(max(1, int(np.ceil(h * steps_per_day))) for h in np.diff(t))
+    solver_info('rk4', nfev=4 * n_steps, nsteps=n_steps, steps_per_day=steps_per_day, scenarios=n_scenarios)
+    return ret
@@ -0,0 +1,121 @@
+# Content-addressed result cache for SEIRD scenarios
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+def scenario_key(*values):
+    """Builds a cache key from the values that fully determine a scenario run.
+
+    Every value is converted to a float64 array, so 1, 1.0 and np.float64(1) give the
+    same key, while differently shaped arrays never collide.
+
+    Parameters
+    ----------
+    *values : float or ndarray
+        Model parameters, initial conditions and time grid
+
+    Returns
+    ----------
+    str
+        Hex digest identifying the scenario
+    """
+    h = hashlib.sha256()
+    for value in values:
+        a = np.ascontiguousarray(value, dtype=np.float64)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+class ScenarioCache:
+    """Two-tier cache of scenario results: an in-memory LRU tier bounded by size, and an
+    optional on-disk tier of .npz files.
+
+    Results are dicts of arrays (as returned by `seird.simulate`). Cached arrays are
+    made read-only, so a hit can hand them out without copying.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Size limit of the in-memory tier; least recently used results are evicted first
+
+    cache_dir : str
+        Directory for the on-disk tier (disabled if None)
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def _remember(self, key, result):
+        """Stores a result in the memory tier and evicts old entries; caller holds the lock."""
+        size = sum(a.nbytes for a in result.values())
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.nbytes -= sum(a.nbytes for a in self._entries.pop(key).values())
+        self._entries[key] = result
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= sum(a.nbytes for a in evicted.values())
+            self.evictions += 1
+
+    def get(self, key):
+        """Looks up a result, returning None (and counting a miss) if it isn't cached."""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(result)
+            if self.cache_dir is not None and os.path.exists(self._path(key)):
+                with np.load(self._path(key)) as f:
+                    result = {name: f[name] for name in f.files}
+                for a in result.values():
+                    a.flags.writeable = False
+                self._remember(key, result)
+                self.hits += 1
+                self.disk_hits += 1
+                return dict(result)
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        """Adds a result to the cache (and to the disk tier, if there is one)."""
+        result = {name: np.array(a) for name, a in result.items()}
+        for a in result.values():
+            a.flags.writeable = False
+        with self._lock:
+            self._remember(key, result)
+        if self.cache_dir is not None:
+            # write then rename, so concurrent readers never see half a file
+            tmp = self._path(key) + '.{}.tmp'.format(os.getpid())
+            with open(tmp, 'wb') as f:
+                np.savez(f, **result)
+            os.replace(tmp, self._path(key))
+
+    def clear(self):
+        """Empties the in-memory tier (the disk tier is left alone)."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Returns hit/miss counters and the current size of the in-memory tier."""
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'entries': len(self._entries), 'nbytes': self.nbytes}
@@ -0,0 +1,211 @@
+# Fitting SEIRD parameters to observed death (and case) counts
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.integrate import odeint
+from scipy.optimize import least_squares
+from seird_sweep import latin_hypercube
+from seird_utils import njit
+
+# parameters that can be fitted, and the range each one is searched in
+FIT_PARAMS = ('R_0_start', 'k', 'x0', 'R_0_end', 'alpha', 'rho')
+BOUNDS = {
+    'R_0_start': (0.5, 10.0),
+    'k': (0.05, 5.0),
+    'x0': (0.0, 100.0),
+    'R_0_end': (0.1, 10.0),
+    'alpha': (0.0, 1.0),
+    'rho': (1.0 / 60, 1.0),
+}
+
+def load_series(path):
+    """Reads an observed time series from a CSV file.
+
+    Parameters
+    ----------
+    path : str
+        CSV file with a header row and columns 'day' and 'deaths' (cumulative), and
+        optionally 'cases' (cumulative reported cases, compared against I + R + D)
+
+    Returns
+    ----------
+    dict
+        Column name -> ndarray
+    """
+    data = np.genfromtxt(path, delimiter=',', names=True)
+    return {name: np.atleast_1d(data[name]).astype(float) for name in data.dtype.names}
+
+@njit(cache=True)
+def sensitivity_deriv(z, t, N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end):
+    """Derivatives of the SEIRD state together with its forward sensitivities.
+
+    Compiled with Numba when it is installed, like `seird_utils.rhs`, since the
+    optimizer calls it hundreds of thousands of times per fit.
+
+    Parameters
+    ----------
+    z : ndarray
+        The 5 SEIRD values followed by the (5, 6) sensitivity matrix dy/dθ, flattened,
+        with θ ordered as FIT_PARAMS
+
+    t : float
+        Time (days)
+
+    N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end : float
+        See `seird_utils.deriv`
+
+    Returns
+    ----------
+    dzdt : ndarray
+        Time derivatives of z, in the same layout
+    """
+    S, E, I = z[0], z[1], z[2]
+
+    # R0(t) = R_0_end + (R_0_start - R_0_end) * q, and its derivatives with respect to θ
+    q = 1 / (1 + math.exp(min(max(k * (t - x0), -700.0), 700.0)))
+    dq = q * (1 - q)
+    b = (R_0_end + (R_0_start - R_0_end) * q) * gamma / N
+    infections = b * S * I
+    scale = gamma * S * I / N
+    dinf = (scale * q, -scale * (R_0_start - R_0_end) * dq * (t - x0), scale * (R_0_start - R_0_end) * dq * k,
+            scale * (1 - q))
+    leave_I = (1 - alpha) * gamma + alpha * rho
+
+    dzdt = np.empty(35)
+    dzdt[0] = -infections
+    dzdt[1] = infections - delta * E
+    dzdt[2] = delta * E - leave_I * I
+    dzdt[3] = (1 - alpha) * gamma * I
+    dzdt[4] = alpha * rho * I
+
+    # d(dy/dθ)/dt = J @ dy/dθ + df/dθ, written out row by row (J is sparse, see `seird_utils.jac`);
+    # row i of the sensitivities is z[5 + 6 * i:11 + 6 * i]
+    for j in range(6):
+        s0, s1, s2 = z[5 + j], z[11 + j], z[17 + j]
+        flow = b * I * s0 + b * S * s2
+        extra = dinf[j] if j < 4 else 0.0
+        dzdt[5 + j] = -flow - extra
+        dzdt[11 + j] = flow - delta * s1 + extra
+        dzdt[17 + j] = delta * s1 - leave_I * s2
+        dzdt[23 + j] = (1 - alpha) * gamma * s2
+        dzdt[29 + j] = alpha * rho * s2
+    dzdt[17 + 4] += (gamma - rho) * I
+    dzdt[23 + 4] -= gamma * I
+    dzdt[29 + 4] += rho * I
+    dzdt[17 + 5] -= alpha * I
+    dzdt[29 + 5] += alpha * I
+    return dzdt
+
+class _Objective:
+    """Residuals and their Jacobian from one integration of the sensitivity system."""
+
+    def __init__(self, series, N, gamma, delta, fixed, names):
+        self.series = series
+        self.N, self.gamma, self.delta = N, gamma, delta
+        self.fixed = fixed
+        self.names = names
+        self.index = [FIT_PARAMS.index(name) for name in names]
+        days = series['day']
+        self.t = days if days[0] == 0 else np.concatenate([[0.0], days])
+        self.skip = 0 if days[0] == 0 else 1
+        # blank CSV cells come back from `load_series` as NaN; they are left out of the residuals
+        self.observed = {col: np.isfinite(series[col]) for col in ('deaths', 'cases') if col in series}
+        self.scale = {col: max(np.abs(series[col][mask]).max(initial=0.0), 1.0) for col, mask in self.observed.items()}
+        self._last = (None, None, None)
+
+    def _evaluate(self, theta):
+        if self._last[0] is not None and np.array_equal(self._last[0], theta):
+            return self._last[1], self._last[2]
+        p = dict(self.fixed, **dict(zip(self.names, theta)))
+        z0 = np.zeros(35)
+        z0[:5] = self.N - 1, 1, 0, 0, 0
+        z = odeint(sensitivity_deriv, z0, self.t, args=(self.N, self.gamma, self.delta, p['alpha'], p['rho'],
+                                                          p['R_0_start'], p['k'], p['x0'], p['R_0_end']))[self.skip:]
+        y, s = z[:, :5], z[:, 5:].reshape(-1, 5, 6)[:, :, self.index]
+        residuals, jacobians = [], []
+        mask = self.observed['deaths']
+        residuals.append((y[mask, 4] - self.series['deaths'][mask]) / self.scale['deaths'])
+        jacobians.append(s[mask, 4, :] / self.scale['deaths'])
+        if 'cases' in self.observed:
+            mask = self.observed['cases']
+            residuals.append((y[mask, 2:].sum(axis=1) - self.series['cases'][mask]) / self.scale['cases'])
+            jacobians.append(s[mask, 2:, :].sum(axis=1) / self.scale['cases'])
+        self._last = (np.array(theta), np.concatenate(residuals), np.vstack(jacobians))
+        return self._last[1], self._last[2]
+
+    def residuals(self, theta):
+        return self._evaluate(theta)[0]
+
+    def jacobian(self, theta):
+        return self._evaluate(theta)[1]
+
+def _fit_one(series, N, gamma, delta, fixed, names, start, bounds, loss):
+    """Runs one local least-squares fit; runs inside a worker process."""
+    objective = _Objective(series, N, gamma, delta, fixed, names)
+    fit = least_squares(objective.residuals, start, jac=objective.jacobian, bounds=bounds, loss=loss, x_scale='jac')
+    return fit.x, fit.cost, fit.success, fit.nfev
+
+def calibrate(series, N, gamma=1.0 / 4, delta=1.0 / 5, fixed=None, bounds=None, n_starts=8, workers=None,
+              loss='linear', seed=None):
+    """Fits the R0 curve, fatality rate and death rate to an observed time series.
+
+    Gradients come from the forward sensitivity equations, integrated alongside the
+    model, so every optimizer step costs one `odeint` run and no finite differences.
+    Several fits from Latin-hypercube starting points run in parallel and the best
+    one is returned.
+
+    Parameters
+    ----------
+    series : dict
+        Observed data with 'day', 'deaths' and optionally 'cases', e.g. from
+        `load_series`; blank (NaN) observations are ignored
+
+    N : float
+        Population
+
+    gamma, delta : float
+        Recovery and incubation rates, kept fixed
+
+    fixed : dict
+        Values for any of FIT_PARAMS that should not be fitted
+
+    bounds : dict
+        Search range per parameter, overriding BOUNDS
+
+    n_starts : int
+        Number of starting points
+
+    workers : int
+        Number of worker processes (default: os.cpu_count()). With 1 worker the fits
+        run in this process.
+
+    loss : str
+        Loss function passed on to scipy.optimize.least_squares, e.g. 'soft_l1'
+        to reduce the pull of outliers
+
+    seed : int
+        Seed for the starting points
+
+    Returns
+    ----------
+    dict
+        Fitted value of every parameter in FIT_PARAMS, plus 'cost' (half the sum of
+        squared scaled residuals), 'success' and 'nfev' of the best fit
+    """
+    fixed = dict(fixed or {})
+    bounds = dict(BOUNDS, **(bounds or {}))
+    names = [name for name in FIT_PARAMS if name not in fixed]
+    low = np.array([bounds[name][0] for name in names])
+    high = np.array([bounds[name][1] for name in names])
+    samples = latin_hypercube({name: bounds[name] for name in names}, n_starts, seed=seed)
+    starts = np.column_stack([samples[name] for name in names])
+    jobs = [(series, N, gamma, delta, fixed, names, start, (low, high), loss) for start in starts]
+
+    if workers == 1:
+        fits = [_fit_one(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or min(n_starts, os.cpu_count())) as executor:
+            fits = list(executor.map(_fit_one, *zip(*jobs)))
+    x, cost, success, nfev = min(fits, key=lambda fit: fit[1])
+    return dict(fixed, **dict(zip(names, x)), cost=cost, success=success, nfev=nfev)
@@ -0,0 +1,223 @@
+# Sequential data assimilation: a particle filter over the SEIRD state and a drifting R0
+#
+#     pf = ParticleFilter(N=1e6)                       # or ParticleFilter.load('pf.npz')
+#     pf.assimilate(load_series('observed.csv'), checkpoint='pf.npz')
+#     pf.forecast(30)
+#
+# Each new day of data costs one day of integration for the particle ensemble.
+import json
+import os
+import numpy as np
+from scipy.special import gammaln
+from seird_batch import batch_deriv, rk4_steps
+
+def _neg_binomial_logpmf(k, mean, dispersion):
+    """Log-probability of k counts under a negative binomial with the given mean (per particle)."""
+    mean = np.maximum(mean, 1e-9)
+    r = dispersion
+    return (gammaln(k + r) - gammaln(r) - gammaln(k + 1)
+            + r * np.log(r / (r + mean)) + k * np.log(mean / (r + mean)))
+
+class ParticleFilter:
+    """Bootstrap particle filter over S, E, I, R, D and a time-varying R0.
+
+    Every particle carries its own SEIRD state and R0. Each day, R0 takes a random-walk
+    step on the log scale, the ensemble is integrated over one day as one vectorized
+    batch, and the particles are reweighted by how well their new deaths (and new
+    cases, I + R + D) match the day's observations, using a negative binomial to allow
+    for reporting noise. When the weights degenerate, the particles are resampled.
+
+    Parameters
+    ----------
+    N : float
+        Population size
+
+    gamma, delta, alpha, rho : float
+        See `seird_utils.deriv`; held fixed
+
+    n_particles : int
+        Size of the ensemble
+
+    R0_prior : tuple
+        (low, high) of the uniform prior on the initial R0
+
+    sigma : float
+        Standard deviation of the daily change in log R0
+
+    dispersion : float
+        Negative binomial dispersion of the observations (smaller is noisier)
+
+    steps_per_day : int
+        Number of RK4 steps per day
+
+    seed : int
+        Seed for np.random.default_rng
+    """
+
+    def __init__(self, N, gamma=1.0 / 4, delta=1.0 / 5, alpha=0.3, rho=1.0 / 9, n_particles=2000, R0_prior=(1.0, 6.0),
+                 sigma=0.1, dispersion=10.0, steps_per_day=4, seed=None):
+        self.settings = {'N': float(N), 'gamma': gamma, 'delta': delta, 'alpha': alpha, 'rho': rho, 'sigma': sigma,
+                         'dispersion': dispersion, 'steps_per_day': steps_per_day}
+        self.rng = np.random.default_rng(seed)
+        self.day = 0
+        self.y = np.zeros((n_particles, 5))
+        self.y[:, 0] = N - 1
+        self.y[:, 1] = 1
+        self.R0 = self.rng.uniform(*R0_prior, n_particles)
+        self.log_weights = np.zeros(n_particles)
+        # last observed cumulative values, to turn the next observations into daily counts
+        self.observed = {'deaths': 0.0, 'cases': 0.0}
+
+    def weights(self):
+        """Returns the normalized particle weights."""
+        w = np.exp(self.log_weights - self.log_weights.max())
+        return w / w.sum()
+
+    def effective_size(self):
+        """Returns the effective number of particles, 1 / sum(w^2)."""
+        return 1.0 / np.sum(self.weights() ** 2)
+
+    def _resample(self):
+        """Systematic resampling: keeps particles in proportion to their weights."""
+        n = len(self.R0)
+        positions = (self.rng.random() + np.arange(n)) / n
+        index = np.minimum(np.searchsorted(np.cumsum(self.weights()), positions), n - 1)
+        self.y = self.y[index]
+        self.R0 = self.R0[index]
+        self.log_weights = np.zeros(n)
+
+    def _advance(self):
+        """Moves every particle forward one day; returns the states before the step."""
+        s = self.settings
+        self.R0 = self.R0 * np.exp(s['sigma'] * self.rng.standard_normal(len(self.R0)))
+        before = self.y
+        args = (s['N'], s['gamma'], s['delta'], s['alpha'], s['rho'], self.R0, 1.0, 0.0, self.R0)
+        for self.y in rk4_steps(batch_deriv, before, np.array([self.day, self.day + 1.0]), args, s['steps_per_day']):
+            pass
+        self.day += 1
+        return before
+
+    def step(self, deaths=None, cases=None):
+        """Advances the filter one day and assimilates that day's observations.
+
+        Parameters
+        ----------
+        deaths, cases : float
+            Cumulative deaths and reported cases observed at the end of the new day
+            (None or NaN if not observed that day)
+
+        Returns
+        ----------
+        float
+            Effective number of particles after the update
+        """
+        before = self._advance()
+        d = self.settings['dispersion']
+        # blank CSV cells come back from `load_series` as NaN
+        deaths = None if deaths is None or not np.isfinite(deaths) else deaths
+        cases = None if cases is None or not np.isfinite(cases) else cases
+        if deaths is not None:
+            k = max(deaths - self.observed['deaths'], 0.0)
+            self.log_weights += _neg_binomial_logpmf(k, self.y[:, 4] - before[:, 4], d)
+            self.observed['deaths'] = float(deaths)
+        if cases is not None:
+            k = max(cases - self.observed['cases'], 0.0)
+            self.log_weights += _neg_binomial_logpmf(k, self.y[:, 2:].sum(axis=1) - before[:, 2:].sum(axis=1), d)
+            self.observed['cases'] = float(cases)
+        ess = self.effective_size()
+        if ess < len(self.R0) / 2:
+            self._resample()
+        return ess
+
+    def assimilate(self, series, checkpoint=None):
+        """Brings the filter up to date with an observed series, skipping days already assimilated.
+
+        Parameters
+        ----------
+        series : dict
+            'day' and cumulative 'deaths', optionally 'cases', e.g. from
+            `seird_calibrate.load_series`; days without a row, and blank (NaN)
+            cells, are stepped over without observations
+
+        checkpoint : str
+            Optional .npz file to save the filter to after every assimilated day
+        """
+        for i, day in enumerate(series['day']):
+            if day <= self.day:
+                continue
+            while self.day < day - 1:
+                self.step()
+            self.step(series['deaths'][i], series['cases'][i] if 'cases' in series else None)
+            if checkpoint is not None:
+                self.save(checkpoint)
+
+    def summary(self, quantiles=(0.05, 0.5, 0.95)):
+        """Weighted quantiles of the current state.
+
+        Returns
+        ----------
+        dict
+            'day', 'state' ((len(quantiles), 5) S, E, I, R, D) and 'R0' ((len(quantiles),))
+        """
+        w = self.weights()
+        return {'day': self.day, 'state': _weighted_quantiles(self.y, w, quantiles),
+                'R0': _weighted_quantiles(self.R0[:, None], w, quantiles)[:, 0]}
+
+    def forecast(self, days, quantiles=(0.05, 0.5, 0.95)):
+        """Projects the ensemble forward without changing the filter.
+
+        R0 keeps drifting as a random walk, so the bands widen with the horizon.
+
+        Parameters
+        ----------
+        days : int
+            Number of days to project
+
+        quantiles : sequence of float
+            Quantiles of the ensemble to return
+
+        Returns
+        ----------
+        ret : ndarray
+            (len(quantiles), days + 1, 5) array of S, E, I, R, D quantiles, starting today
+        """
+        state = (self.y, self.R0, self.day, self.rng.bit_generator.state)
+        w = self.weights()
+        ret = np.empty((len(quantiles), days + 1, 5))
+        ret[:, 0] = _weighted_quantiles(self.y, w, quantiles)
+        for i in range(days):
+            self._advance()
+            ret[:, i + 1] = _weighted_quantiles(self.y, w, quantiles)
+        self.y, self.R0, self.day, self.rng.bit_generator.state = state
+        return ret
+
+    def save(self, path):
+        """Checkpoints the filter to an .npz file (written atomically)."""
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, y=self.y, R0=self.R0, log_weights=self.log_weights, day=self.day,
+                     settings=json.dumps(self.settings), observed=json.dumps(self.observed),
+                     rng=json.dumps(self.rng.bit_generator.state))
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        """Restores a filter saved with `save`."""
+        with np.load(path) as data:
+            settings = json.loads(str(data['settings']))
+            pf = cls(settings.pop('N'), n_particles=len(data['R0']), **settings)
+            pf.y, pf.R0, pf.log_weights = data['y'], data['R0'], data['log_weights']
+            pf.day = int(data['day'])
+            pf.observed = json.loads(str(data['observed']))
+            pf.rng.bit_generator.state = json.loads(str(data['rng']))
+        return pf
+
+def _weighted_quantiles(values, weights, quantiles):
+    """Quantiles of each column of values (n, m) under particle weights; returns (len(quantiles), m)."""
+    order = np.argsort(values, axis=0)
+    cdf = np.cumsum(weights[order], axis=0)
+    cdf /= cdf[-1]
+    out = np.empty((len(quantiles), values.shape[1]))
+    for j in range(values.shape[1]):
+        index = np.minimum(np.searchsorted(cdf[:, j], quantiles), len(values) - 1)
+        out[:, j] = values[order[index, j], j]
+    return out
@@ -0,0 +1,127 @@
+# Metapopulation SEIRD model: many regions coupled by commuting flows
+import numpy as np
+from scipy import sparse
+from seird_batch import rk4_steps
+from seird_utils import logistic_R_0
+
+def meta_deriv(y, t, mobility, mobility_T, N_present, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end):
+    """Calculates the SEIRD derivatives for every region of a metapopulation.
+
+    Residents of region i spend a fraction mobility[i, j] of their day in region j.
+    Infection happens where people are: the force of infection in region j comes from
+    the infected present there, and residents of i feel the mobility-weighted average
+    over the regions they visit. That takes two sparse matrix-vector products per call.
+
+    Parameters
+    ----------
+    y : ndarray
+        (n_regions, 5) matrix of current S, E, I, R, D values per region
+
+    t : float
+        Time (days)
+
+    mobility : scipy.sparse.csr_matrix
+        (n_regions, n_regions) row-stochastic mobility matrix
+
+    mobility_T : scipy.sparse.csr_matrix
+        Transpose of mobility, in CSR format
+
+    N_present : ndarray
+        Number of people present in each region during the day (mobility.T @ N)
+
+    gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end : ndarray or float
+        Per-region parameters of shape (n_regions,), or scalars shared by every
+        region. See `seird_utils.deriv` for their meaning. The R0 curve of a region
+        applies to infections happening in that region.
+
+    Returns
+    ----------
+    dydt : ndarray
+        (n_regions, 5) matrix of derivatives of S, E, I, R, D with respect to time
+    """
+    S, E, I = y[:, 0], y[:, 1], y[:, 2]
+    beta = logistic_R_0(t, R_0_start, k, x0, R_0_end) * gamma
+    force_present = beta * (mobility_T @ I) / N_present
+    infections = S * (mobility @ force_present)
+    recoveries = (1 - alpha) * gamma * I
+    deaths = alpha * rho * I
+    dydt = np.empty_like(y)
+    dydt[:, 0] = -infections
+    dydt[:, 1] = infections - delta * E
+    dydt[:, 2] = delta * E - recoveries - deaths
+    dydt[:, 3] = recoveries
+    dydt[:, 4] = deaths
+    return dydt
+
+def mobility_from_flows(flows, N, time_away=1.0 / 3):
+    """Builds a row-stochastic mobility matrix from commuting flows.
+
+    Parameters
+    ----------
+    flows : scipy.sparse matrix or ndarray
+        (n_regions, n_regions) matrix; flows[i, j] is the number of residents of
+        region i who commute to region j (the diagonal is ignored)
+
+    N : ndarray
+        Resident population of each region
+
+    time_away : float
+        Fraction of the day commuters spend in the region they commute to
+
+    Returns
+    ----------
+    scipy.sparse.csr_matrix
+        Mobility matrix for `meta_odeint`
+    """
+    flows = sparse.csr_matrix(flows, dtype=float)
+    flows.setdiag(0)
+    flows.eliminate_zeros()
+    N = np.asarray(N, dtype=float)
+    away = sparse.diags(time_away / N) @ flows
+    home = 1 - np.asarray(away.sum(axis=1)).ravel()
+    return (away + sparse.diags(home)).tocsr()
+
+def meta_odeint(y0, t, mobility, N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end, steps_per_day=10):
+    """Integrates the metapopulation SEIRD equations for all regions at once.
+
+    Parameters
+    ----------
+    y0 : ndarray
+        (n_regions, 5) matrix of initial S, E, I, R, D values
+
+    t : ndarray
+        Grid of time points (in days)
+
+    mobility : scipy.sparse matrix or ndarray
+        (n_regions, n_regions) matrix; mobility[i, j] is the fraction of residents of
+        region i who spend their day in region j. Rows must sum to 1 (staying home is
+        the diagonal).
+
+    N : ndarray
+        Resident population of each region
+
+    gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end : ndarray or float
+        Per-region parameters of shape (n_regions,), or scalars shared by every region
+
+    steps_per_day : int
+        Minimum number of RK4 sub-steps per day
+
+    Returns
+    ----------
+    ret : ndarray
+        (n_regions, len(t), 5) array of S, E, I, R, D values
+    """
+    mobility = sparse.csr_matrix(mobility, dtype=float)
+    row_sums = np.asarray(mobility.sum(axis=1)).ravel()
+    if not np.allclose(row_sums, 1):
+        raise ValueError('Rows of the mobility matrix must sum to 1')
+    mobility_T = mobility.T.tocsr()
+    N_present = mobility_T @ np.asarray(N, dtype=float)
+    y0 = np.asarray(y0, dtype=float)
+    t = np.asarray(t, dtype=float)
+    args = (mobility, mobility_T, N_present, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end)
+
+    ret = np.empty((y0.shape[0], len(t), 5))
+    for i, y in enumerate(rk4_steps(meta_deriv, y0, t, args, steps_per_day)):
+        ret[:, i, :] = y
+    return ret
@@ -0,0 +1,103 @@
+# Derived metrics of SEIRD results, vectorized over whole ensembles
+#
+# Every function takes results shaped like the solvers return them: a single (n_days, 5)
+# trajectory, or an (n_scenarios, n_days, 5) ensemble (any leading axes work), with the
+# compartments S, E, I, R, D along the last axis.
+import numpy as np
+
+S, E, I, R, D = range(5)
+
+def peak_infections(ret):
+    """Returns the largest number of infected people of each trajectory."""
+    return ret[..., I].max(axis=-1)
+
+def peak_day(ret, t):
+    """Returns the day on which infections peak in each trajectory."""
+    return np.asarray(t)[ret[..., I].argmax(axis=-1)]
+
+def cumulative_deaths(ret):
+    """Returns the deaths by the last day of each trajectory."""
+    return ret[..., -1, D]
+
+def cfr(ret):
+    """Case fatality rate over time, D / (I + R + D): deaths as a share of everyone infected so far.
+
+    Returns
+    ----------
+    ndarray
+        Same shape as ret without its last axis; 0 where nobody has been infected yet
+    """
+    cases = ret[..., I] + ret[..., R] + ret[..., D]
+    return np.divide(ret[..., D], cases, out=np.zeros_like(cases), where=cases > 0)
+
+def effective_R(ret, R0):
+    """Effective reproduction number over time, R_t = R0(t) * S / N.
+
+    Parameters
+    ----------
+    ret : ndarray
+        (..., n_days, 5) results
+
+    R0 : ndarray
+        R0 over time, (n_days,) shared or (..., n_days) per trajectory
+
+    Returns
+    ----------
+    ndarray
+        Same shape as ret without its last axis
+    """
+    return R0 * ret[..., S] / ret.sum(axis=-1)
+
+def growth_rate(ret, t, compartment=I):
+    """Daily exponential growth rate of a compartment, d ln(x) / dt (negative while it shrinks)."""
+    x = np.maximum(ret[..., compartment], 1e-12)
+    return np.gradient(np.log(x), np.asarray(t, dtype=float), axis=-1)
+
+def doubling_time(ret, t, compartment=I):
+    """Doubling time (days) of a compartment over time, ln(2) / growth rate.
+
+    Negative values are halving times: -7 means the compartment halves every 7 days.
+    Where the compartment is flat the result is inf.
+    """
+    r = growth_rate(ret, t, compartment)
+    with np.errstate(divide='ignore'):
+        return np.log(2) / r
+
+def summarize(ret, t, R0=None):
+    """Computes the scalar metrics of each trajectory at once.
+
+    Parameters
+    ----------
+    ret : ndarray
+        (..., n_days, 5) results, e.g. the output of `seird_sweep.sweep`
+
+    t : ndarray
+        Grid of time points (in days)
+
+    R0 : ndarray
+        Optional R0 over time, to include the final effective R
+
+    Returns
+    ----------
+    dict
+        'peak_infections', 'peak_day', 'cumulative_deaths', 'final_cfr' and
+        'initial_doubling_time' (of E + I over the first week), plus 'final_R_t' if
+        R0 is given, each of shape ret.shape[:-2]
+    """
+    ret = np.asarray(ret)
+    t = np.asarray(t, dtype=float)
+    week = max(int(np.searchsorted(t, t[0] + 7)), 1)
+    cases = ret[..., -1, I] + ret[..., -1, R] + ret[..., -1, D]
+    active = np.maximum(ret[..., E] + ret[..., I], 1e-12)
+    with np.errstate(divide='ignore'):
+        doubling = np.log(2) * (t[week] - t[0]) / np.log(active[..., week] / active[..., 0])
+    summary = {
+        'peak_infections': peak_infections(ret),
+        'peak_day': peak_day(ret, t),
+        'cumulative_deaths': cumulative_deaths(ret),
+        'final_cfr': np.divide(ret[..., -1, D], cases, out=np.zeros_like(cases), where=cases > 0),
+        'initial_doubling_time': doubling,
+    }
+    if R0 is not None:
+        summary['final_R_t'] = np.asarray(R0)[..., -1] * ret[..., -1, S] / ret[..., -1, :].sum(axis=-1)
+    return summary
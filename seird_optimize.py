@@ -0,0 +1,223 @@
+# Search for policy timings that trade off deaths against time spent under restrictions
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.special import expit
+from seird import scenario_args, make_policy
+from seird_batch import batch_flows, rk4_steps
+from seird_utils import table_R_0, POLICIES
+
+def policy_deriv(y, t, N, gamma, delta, alpha, rho, t0, dt, R0_table, k, decrements, onsets, ends):
+    """Calculates the SEIRD derivatives for a batch of policy schedules.
+
+    Every scenario shares the epidemic parameters and the baseline R0 schedule; they
+    differ only in when each policy starts and ends. A policy lowers R0 by its
+    decrement, phased in around its onset and out around its end with steepness k.
+
+    Parameters
+    ----------
+    y : ndarray
+        (n_scenarios, 5) matrix of current S, E, I, R, D values
+
+    t : float
+        Time (days)
+
+    N, gamma, delta, alpha, rho : float
+        See `seird_utils.deriv`
+
+    t0, dt, R0_table : float, float, ndarray
+        Baseline R0 schedule, as returned by `R0Schedule.tabulate`
+
+    k : float
+        How quickly policies phase in and out
+
+    decrements : ndarray
+        (n_policies,) amount each policy lowers R0 by
+
+    onsets, ends : ndarray
+        (n_scenarios, n_policies) days each policy starts and ends
+
+    Returns
+    ----------
+    dydt : ndarray
+        (n_scenarios, 5) matrix of derivatives of S, E, I, R, D with respect to time
+    """
+    active = expit(k * (t - onsets)) - expit(k * (t - ends))
+    R_0 = np.maximum(table_R_0(t, t0, dt, R0_table) - active @ decrements, 0.0)
+    return batch_flows(y, R_0 * gamma / N, gamma, delta, alpha, rho)
+
+def intervention_days(onsets, durations, days):
+    """Total number of policy-days each schedule spends inside the simulated horizon."""
+    return np.sum(np.clip(np.minimum(onsets + durations, days) - onsets, 0, None), axis=-1)
+
+def evaluate(onsets, durations, args, k, decrements, days, steps_per_day=4):
+    """Final deaths of a batch of policy schedules.
+
+    Parameters
+    ----------
+    onsets, durations : ndarray
+        (n_scenarios, n_policies) start day and length (days) of each policy
+
+    args : tuple
+        (N, gamma, delta, alpha, rho, t0, dt, R0_table), from `seird.scenario_args`
+
+    k : float
+        How quickly policies phase in and out
+
+    decrements : ndarray
+        (n_policies,) amount each policy lowers R0 by
+
+    days : int
+        Number of days to simulate
+
+    steps_per_day : int
+        Number of RK4 steps per day
+
+    Returns
+    ----------
+    ndarray
+        (n_scenarios,) deaths by the last day
+    """
+    onsets = np.atleast_2d(onsets)
+    N = args[0]
+    y0 = np.zeros((len(onsets), 5))
+    y0[:, 0] = N - 1
+    y0[:, 1] = 1
+    for y in rk4_steps(policy_deriv, y0, np.array([0.0, days - 1]),
+                       args + (k, decrements, onsets, onsets + durations), steps_per_day):
+        pass
+    return y[:, 4]
+
+def pareto_front(deaths, cost):
+    """Indices of the schedules no other schedule beats on both deaths and cost, by increasing cost."""
+    order = np.lexsort((deaths, cost))
+    best = np.minimum.accumulate(deaths[order])
+    keep = np.concatenate([[True], best[1:] < best[:-1]])
+    return order[keep]
+
+def _evaluate_chunks(executor, chunks, onsets, durations, *args):
+    """Evaluates a population, split over the worker processes if there is a pool."""
+    if executor is None:
+        return evaluate(onsets, durations, *args)
+    futures = [executor.submit(evaluate, onsets[a:b], durations[a:b], *args) for a, b in chunks]
+    return np.concatenate([future.result() for future in futures])
+
+def optimize(params=None, policies=None, population=256, generations=100, workers=1, seed=None,
+             steps_per_day=4, F=0.7, CR=0.9, progress=None):
+    """Searches policy onset days and durations for the best trade-offs between deaths and intervention-days.
+
+    Runs a differential evolution (rand/1/bin) in which every member of the population
+    minimizes its own weighted sum of deaths and intervention-days, with weights
+    spread from "deaths only" to "cost only", so the population as a whole covers the
+    trade-off curve. Each generation is integrated as one vectorized batch (split over
+    the worker processes), and every schedule evaluated on the way is kept, so the
+    returned Pareto front is taken over population * (generations + 1) schedules.
+
+    Parameters
+    ----------
+    params : dict
+        Scenario settings, as for `seird.simulate` (without 'policies'); the R0 curve
+        they give is the baseline the policies lower
+
+    policies : sequence
+        Policies to schedule, keys of `seird_utils.POLICIES` or Policy tuples
+        (default: all of POLICIES); their onsets are ignored
+
+    population : int
+        Number of schedules per generation
+
+    generations : int
+        Number of generations
+
+    workers : int
+        Number of worker processes (None: os.cpu_count()); with 1 the batches run in
+        this process
+
+    seed : int
+        Seed for np.random.default_rng
+
+    steps_per_day : int
+        Number of RK4 steps per day
+
+    F, CR : float
+        Differential weight and crossover probability
+
+    progress : function
+        Called as progress(generation, generations) after each generation
+
+    Returns
+    ----------
+    dict
+        The Pareto-optimal schedules, by increasing cost: 'onset' and 'duration'
+        ((n, n_policies) days), 'deaths' and 'intervention_days' ((n,)), plus
+        'policies' (names), 'baseline_deaths' (no policies) and 'evaluations'
+    """
+    params = dict(params or {})
+    if params.get('policies'):
+        raise ValueError('The optimizer chooses the policies; leave them out of params')
+    policies = [make_policy(spec) for spec in (POLICIES if policies is None else policies)]
+    _, args, days, _ = scenario_args(params)
+    k = float(params.get('k', 1.0))
+    decrements = np.array([policy.decrement for policy in policies])
+    n_policies = len(policies)
+    rng = np.random.default_rng(seed)
+    evaluate_args = (args, k, decrements, days, steps_per_day)
+
+    baseline = evaluate(np.zeros((1, n_policies)), np.zeros((1, n_policies)), *evaluate_args)[0]
+    max_cost = n_policies * days
+    weights = np.linspace(0.0, 1.0, population)
+
+    def scores(deaths, cost):
+        return (1 - weights) * deaths / max(baseline, 1.0) + weights * cost / max_cost
+
+    # decision vector: onsets then durations, all in [0, days]
+    dim = 2 * n_policies
+    x = rng.random((population, dim)) * days
+    history = []
+    n_workers = workers or os.cpu_count() or 1
+    executor = None if n_workers == 1 else ProcessPoolExecutor(max_workers=n_workers)
+    try:
+        bounds = np.linspace(0, population, n_workers + 1).astype(int)
+        chunks = [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+        def run(x):
+            onsets, durations = x[:, :n_policies], x[:, n_policies:]
+            deaths = _evaluate_chunks(executor, chunks, onsets, durations, *evaluate_args)
+            cost = intervention_days(onsets, durations, days)
+            history.append((x.copy(), deaths, cost))
+            return deaths, cost
+
+        deaths, cost = run(x)
+        fitness = scores(deaths, cost)
+        for generation in range(generations):
+            # three distinct partners per member, none of them the member itself
+            partners = np.argsort(rng.random((population, population - 1)), axis=1)[:, :3]
+            partners += partners >= np.arange(population)[:, None]
+            a, b, c = x[partners[:, 0]], x[partners[:, 1]], x[partners[:, 2]]
+            mutant = np.clip(a + F * (b - c), 0.0, days)
+            cross = rng.random((population, dim)) < CR
+            cross[np.arange(population), rng.integers(0, dim, population)] = True
+            trial = np.where(cross, mutant, x)
+            trial_deaths, trial_cost = run(trial)
+            trial_fitness = scores(trial_deaths, trial_cost)
+            better = trial_fitness <= fitness
+            x[better], fitness[better] = trial[better], trial_fitness[better]
+            if progress is not None:
+                progress(generation + 1, generations)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    xs = np.concatenate([h[0] for h in history])
+    deaths = np.concatenate([h[1] for h in history])
+    cost = np.concatenate([h[2] for h in history])
+    front = pareto_front(deaths, cost)
+    return {
+        'policies': [policy.name for policy in policies],
+        'onset': xs[front, :n_policies],
+        'duration': xs[front, n_policies:],
+        'deaths': deaths[front],
+        'intervention_days': cost[front],
+        'baseline_deaths': baseline,
+        'evaluations': len(deaths),
+    }
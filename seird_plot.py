@@ -0,0 +1,333 @@
+# Plotting functions for SEIRD model
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from seird_metrics import effective_R
+from seird_profile import phase
+
+def plotseird(t, S, E, I, R, D=None, L=None, R0=None, Alpha=None, CFR=None, show=True):
+    """ Performs necessary plotting for SEIRD model parameters. 
+
+    Parameters
+    ----------
+    t : int
+        Time (days)
+    S : int
+        Number of susceptible individuals at time t
+    E : int
+        Number of exposed individuals at time t
+    I : int
+        Number of infected individuals at time t
+    R : int
+        Number of recovered individuals at time t
+    D : int
+        Number of deceased individuals at time t
+    R0 : float
+        Basic reproduction number at time t, drawn together with the effective R_t = R0 * S / N
+    Alpha : float
+        Fatality rate
+    CFR : float
+        Case Fatality Rate (CFR) - the total number of deaths as a proportion of reported cases at time t
+    show : bool
+        Show the figures; pass False to keep them open instead, e.g. to save them
+
+    Returns
+    -------
+    list of matplotlib.figure.Figure or None
+        Plots SEIRD Graph; the figures are returned when show is False
+
+    Code sourced from https://towardsdatascience.com/infectious-disease-modelling-part-i-understanding-sir-28d60e29fdfc  
+    """
+    with phase('render'):
+        f, ax = plt.subplots(1,1,figsize=(10,4))
+        draw_seird(ax, t, S, E, I, R, D, L)
+    figures = [f]
+    if show:
+        plt.show();
+
+    with phase('render'):
+        if R0 is not None or Alpha is not None or CFR is not None:
+            f = plt.figure(figsize=(12,4))
+            figures.append(f)
+
+        if R0 is not None:
+            # sp1
+            ax = f.add_subplot(121)
+            draw_series(ax, t, R0, 'b--', 'R_0', 'R_0 over time')
+            draw_series(ax, t, effective_R(np.stack([S, E, I, R, S * 0 if D is None else D], axis=-1), R0),
+                        'g-', 'R_t', 'R_0 and effective R_t over time')
+
+        if Alpha is not None or CFR is not None:
+            # sp2
+            ax = f.add_subplot(122)
+            if Alpha is not None:
+                draw_series(ax, t, Alpha, 'r--', 'alpha', 'fatality rate over time')
+            if CFR is not None:
+                draw_series(ax, t, CFR, 'k-', 'CFR', 'case fatality rate over time')
+
+    if show:
+        if len(figures) > 1:
+            plt.show()
+        return None
+    return figures
+
+def draw_seird(ax, t, S, E, I, R, D=None, L=None):
+    """ Draws the SEIRD curves onto an existing set of axes.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        Axes to draw on
+    t, S, E, I, R, D, L :
+        See `plotseird`
+
+    Returns
+    -------
+    list of matplotlib.lines.Line2D
+        The S, E, I, R, (D,) and Total lines, in that order
+    """
+    lines = []
+    lines += ax.plot(t, S, 'b', alpha=0.7, linewidth=2, label='Susceptible')
+    lines += ax.plot(t, E, 'y', alpha=0.7, linewidth=2, label='Exposed')
+    lines += ax.plot(t, I, 'r', alpha=0.7, linewidth=2, label='Infected')
+    lines += ax.plot(t, R, 'g', alpha=0.7, linewidth=2, label='Recovered')
+    if D is not None:
+        lines += ax.plot(t, D, 'k', alpha=0.7, linewidth=2, label='Dead')
+        lines += ax.plot(t, S+E+I+R+D, 'c--', alpha=0.7, linewidth=2, label='Total')
+    else:
+        lines += ax.plot(t, S+E+I+R, 'c--', alpha=0.7, linewidth=2, label='Total')
+
+    ax.set_xlabel('Time (days)')
+    ax.set_ylabel('Number of People')
+
+    ax.yaxis.set_tick_params(length=0)
+    ax.xaxis.set_tick_params(length=0)
+    ax.grid(visible=True, which='major', c='w', lw=2, ls='-')
+    legend = ax.legend(borderpad=2.0)
+    legend.get_frame().set_alpha(0.5)
+    for spine in ('top', 'right', 'bottom', 'left'):
+        ax.spines[spine].set_visible(False)
+    if L is not None:
+        ax.set_title("Lockdown after {} days".format(L))
+    return lines
+
+def draw_series(ax, t, values, style, label, title):
+    """ Draws a single series over time (e.g. R0) onto an existing set of axes.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        Axes to draw on
+    t : int
+        Time (days)
+    values : float
+        Value of the series at time t
+    style : str
+        Matplotlib format string, e.g. 'b--'
+    label : str
+        Legend label
+    title : str
+        Axes title
+
+    Returns
+    -------
+    matplotlib.lines.Line2D
+        The series line
+    """
+    line, = ax.plot(t, values, style, alpha=0.7, linewidth=2, label=label)
+
+    ax.set_xlabel('Time (days)')
+    ax.title.set_text(title)
+
+    ax.yaxis.set_tick_params(length=0)
+    ax.xaxis.set_tick_params(length=0)
+    ax.grid(visible=True, which='major', c='w', lw=2, ls='-')
+    legend = ax.legend()
+    legend.get_frame().set_alpha(0.5)
+    for spine in ('top', 'right', 'bottom', 'left'):
+        ax.spines[spine].set_visible(False)
+    return line
+
+class ScenarioRenderer:
+    """ Renders SEIRD figures to files without a display, reusing one figure.
+
+    The figure, axes and lines are built once; each scenario only replaces the line
+    data, axis limits and title before the figure is saved. The figure is not managed
+    by pyplot, so it works with any backend and is never shown.
+
+    Parameters
+    ----------
+    t : ndarray
+        Time (days) shared by every scenario
+    rows, cols : int
+        Layout of a page; with more than one panel, `render_page` draws small
+        multiples with a shared legend
+    figsize : tuple
+        Figure size in inches (default: 10x4 per panel, at most 16 wide)
+    dpi : int
+        Resolution of raster output (PNG)
+    """
+
+    def __init__(self, t, rows=1, cols=1, figsize=None, dpi=100):
+        self.t = np.asarray(t, dtype=float)
+        if figsize is None:
+            figsize = (10, 4) if rows * cols == 1 else (min(16, 4 * cols), 3 * rows)
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(rows, cols, squeeze=False).ravel()
+        zeros = np.zeros_like(self.t)
+        self.lines = [draw_seird(ax, self.t, zeros, zeros, zeros, zeros, zeros) for ax in self.axes]
+        if len(self.axes) > 1:
+            for ax in self.axes:
+                ax.get_legend().remove()
+                ax.set_xlabel('')
+                ax.set_ylabel('')
+            self.figure.legend(self.lines[0], [line.get_label() for line in self.lines[0]],
+                               loc='lower center', ncol=len(self.lines[0]))
+            self.figure.subplots_adjust(bottom=0.12, hspace=0.4)
+
+    def _update(self, ax, lines, ret, title):
+        """ Puts one (len(t), 5) result on a panel. """
+        ret = np.asarray(ret)
+        for i, line in enumerate(lines[:5]):
+            line.set_ydata(ret[:, i])
+        total = ret.sum(axis=1)
+        lines[5].set_ydata(total)
+        ax.set_xlim(self.t[0], self.t[-1])
+        ax.set_ylim(0, 1.05 * max(total.max(), ret.max(), 1.0))
+        ax.set_title(title or '')
+
+    def render(self, ret, path, title=None):
+        """ Saves one scenario to path; the format (png, svg, pdf, ...) follows its extension.
+
+        Parameters
+        ----------
+        ret : ndarray
+            (len(t), 5) array of S, E, I, R, D values
+        path : str
+            Output file
+        title : str
+            Optional figure title
+        """
+        with phase('render'):
+            self._update(self.axes[0], self.lines[0], ret, title)
+            self.figure.savefig(path)
+
+    def render_page(self, ret, path, titles=None):
+        """ Saves up to rows*cols scenarios as small multiples on one page.
+
+        Parameters
+        ----------
+        ret : ndarray
+            (n, len(t), 5) array of S, E, I, R, D values, n <= rows*cols
+        path : str
+            Output file
+        titles : sequence of str
+            Optional panel titles
+        """
+        with phase('render'):
+            for i, (ax, lines) in enumerate(zip(self.axes, self.lines)):
+                ax.set_visible(i < len(ret))
+                if i < len(ret):
+                    self._update(ax, lines, ret[i], None if titles is None else titles[i])
+            self.figure.savefig(path)
+
+def _render_files(t, ret, paths, titles, figsize, dpi):
+    """ Renders one scenario per file; runs inside a worker process. """
+    renderer = ScenarioRenderer(t, figsize=figsize, dpi=dpi)
+    for i, path in enumerate(paths):
+        renderer.render(ret[i], path, None if titles is None else titles[i])
+
+def _render_pages(t, ret, paths, titles, rows, cols, figsize, dpi):
+    """ Renders pages of small multiples; runs inside a worker process. """
+    renderer = ScenarioRenderer(t, rows, cols, figsize, dpi)
+    per_page = rows * cols
+    for page, path in enumerate(paths):
+        rows_ = slice(page * per_page, (page + 1) * per_page)
+        renderer.render_page(ret[rows_], path, None if titles is None else titles[rows_])
+
+def _split(n, workers):
+    """ Cuts range(n) into at most `workers` contiguous (start, stop) pieces. """
+    workers = max(1, min(workers or os.cpu_count() or 1, n))
+    bounds = np.linspace(0, n, workers + 1).astype(int)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def render_scenarios(t, ret, paths, titles=None, figsize=None, dpi=100, workers=1):
+    """ Renders one SEIRD figure per scenario to a file, without a display.
+
+    Parameters
+    ----------
+    t : ndarray
+        Time (days)
+    ret : ndarray or seird_store.ResultStore
+        (n_scenarios, len(t), 5) array of S, E, I, R, D values, e.g. from `seird_sweep.sweep`
+    paths : sequence of str
+        One output file per scenario; the format follows each extension (png, svg, pdf)
+    titles : sequence of str
+        Optional title per scenario
+    figsize : tuple
+        Figure size in inches
+    dpi : int
+        Resolution of raster output
+    workers : int
+        Number of worker processes (None: os.cpu_count()); each renders a contiguous
+        block of scenarios with its own reused figure
+    """
+    pieces = _split(len(paths), workers)
+    if not pieces:
+        return
+    if len(pieces) == 1:
+        _render_files(t, ret, paths, titles, figsize, dpi)
+        return
+    with ProcessPoolExecutor(max_workers=len(pieces)) as executor:
+        futures = [executor.submit(_render_files, t, np.asarray(ret[a:b]), paths[a:b],
+                                   None if titles is None else titles[a:b], figsize, dpi) for a, b in pieces]
+        for future in futures:
+            future.result()
+
+def render_pages(t, ret, path_pattern, rows=4, cols=4, titles=None, figsize=None, dpi=100, workers=1):
+    """ Renders scenarios as pages of rows x cols small multiples, without a display.
+
+    Parameters
+    ----------
+    t : ndarray
+        Time (days)
+    ret : ndarray or seird_store.ResultStore
+        (n_scenarios, len(t), 5) array of S, E, I, R, D values
+    path_pattern : str
+        Output file name with a page number placeholder, e.g. 'report/page_{:03d}.pdf'
+    rows, cols : int
+        Panels per page
+    titles : sequence of str
+        Optional title per scenario
+    figsize : tuple
+        Page size in inches
+    dpi : int
+        Resolution of raster output
+    workers : int
+        Number of worker processes (None: os.cpu_count())
+
+    Returns
+    -------
+    list of str
+        The files written, one per page
+    """
+    per_page = rows * cols
+    n_pages = -(-len(ret) // per_page)
+    paths = [path_pattern.format(page) for page in range(n_pages)]
+    pieces = _split(n_pages, workers)
+    if not pieces:
+        return paths
+    if len(pieces) == 1:
+        _render_pages(t, ret, paths, titles, rows, cols, figsize, dpi)
+        return paths
+    with ProcessPoolExecutor(max_workers=len(pieces)) as executor:
+        futures = [executor.submit(_render_pages, t, np.asarray(ret[a * per_page:b * per_page]), paths[a:b],
+                                   None if titles is None else titles[a * per_page:b * per_page],
+                                   rows, cols, figsize, dpi) for a, b in pieces]
+        for future in futures:
+            future.result()
+    return paths
@@ -0,0 +1,120 @@
+# Opt-in instrumentation: RHS evaluation counters, phase timers and solver statistics
+#
+# Nothing is recorded unless a `profiled` block is active, and while none is, the solver
+# gets the plain right hand side, so the hot path is unchanged:
+#
+#     with profiled(out='profile.json') as profile:
+#         simulate(params)
+#     profile.counters['rhs'], profile.timers['integrate']
+import contextlib
+import json
+import logging
+import time
+
+logger = logging.getLogger('seird')
+
+# the profile of the innermost active `profiled` block, or None
+_active = None
+
+class Profile:
+    """Counters, phase timers and solver statistics collected during a `profiled` block.
+
+    Attributes
+    ----------
+    counters : dict
+        Name -> number of calls, e.g. 'rhs' and 'jac' evaluations
+    timers : dict
+        Phase name -> total seconds, e.g. 'setup', 'integrate', 'post-process', 'render'
+    solvers : list of dict
+        One entry per solver call: the method and its statistics (function and
+        Jacobian evaluations, steps, and for odeint the number of output intervals
+        spent on the stiff (BDF) method)
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}
+        self.solvers = []
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def to_dict(self):
+        return {'counters': dict(self.counters), 'timers': dict(self.timers), 'solvers': list(self.solvers)}
+
+class profiled(contextlib.ContextDecorator):
+    """Context manager (or function decorator) that turns instrumentation on.
+
+    Parameters
+    ----------
+    out : str
+        Optional path to write the collected profile to as JSON on exit
+
+    log : bool
+        Also log the profile as JSON on the 'seird' logger
+
+    level : int
+        Logging level for `log`
+    """
+
+    def __init__(self, out=None, log=False, level=logging.INFO):
+        self.out = out
+        self.log = log
+        self.level = level
+
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        self.profile = _active = Profile()
+        return self.profile
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous
+        report = self.profile.to_dict()
+        if self.out is not None:
+            with open(self.out, 'w') as f:
+                json.dump(report, f, indent=2)
+        if self.log:
+            logger.log(self.level, json.dumps(report))
+        return False
+
+def active():
+    """Returns the active Profile, or None when instrumentation is off."""
+    return _active
+
+@contextlib.contextmanager
+def _timed(profile, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_time(name, time.perf_counter() - start)
+
+def phase(name):
+    """Times the enclosed block as phase `name` (a no-op when instrumentation is off).
+
+    Usage: with phase('integrate'): ...
+    """
+    if _active is None:
+        return contextlib.nullcontext()
+    return _timed(_active, name)
+
+def counted(func, name):
+    """Returns func wrapped to count its calls as `name`, or func itself when instrumentation is off."""
+    profile = _active
+    if profile is None or func is None:
+        return func
+
+    def wrapper(*args):
+        profile.count(name)
+        return func(*args)
+    return wrapper
+
+def solver_info(method, **stats):
+    """Records the statistics of one solver call, if instrumentation is on."""
+    if _active is not None:
+        _active.solvers.append(dict(method=method, **stats))
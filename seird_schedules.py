@@ -0,0 +1,170 @@
+# R0 schedules: how the basic reproduction number changes over time
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+from seird_utils import staged_R_0, fold_policies
+
+class R0Schedule:
+    """Base class for R0 over time.
+
+    Subclasses implement `__call__` for vectorized evaluation (e.g. for plotting) and set
+    `horizon`, the day after which R0 no longer changes. `tabulate` precomputes the
+    schedule once on a dense grid for the solver, which then only interpolates in the
+    table (see `seird_utils.table_rhs`).
+    """
+
+    horizon = 0.0
+
+    def __call__(self, t):
+        raise NotImplementedError
+
+    def tabulate(self, t_end, points_per_day=100):
+        """Precomputes the schedule on a uniform grid from day 0.
+
+        Parameters
+        ----------
+        t_end : float
+            Last day needed; the table always reaches at least `horizon`, so holding
+            its last value is exact from there on
+
+        points_per_day : int
+            Grid resolution
+
+        Returns
+        ----------
+        t0 : float
+            First day of the grid
+
+        dt : float
+            Grid spacing (days)
+
+        values : ndarray
+            R0 at every grid point, never negative
+        """
+        n = int(np.ceil(max(t_end, self.horizon) * points_per_day)) + 2
+        dt = 1.0 / points_per_day
+        return 0.0, dt, np.maximum(self(np.arange(n) * dt), 0.0)
+
+    def with_policies(self, policies, k=1.0):
+        """Returns this schedule with the given policies phased in on top of it."""
+        return PolicySchedule(self, policies, k) if policies else self
+
+class LogisticSchedule(R0Schedule):
+    """Logistic change from R_0_start to R_0_end around day x0 (see `seird_utils.logistic_R_0`).
+
+    x0 and R_0_end may also be arrays, for several logistic stages in a row (see
+    `seird_utils.staged_R_0`).
+    """
+
+    def __init__(self, R_0_start, k, x0, R_0_end):
+        self.R_0_start = float(R_0_start)
+        self.k = float(k)
+        self.x0 = np.atleast_1d(np.asarray(x0, dtype=float))
+        self.R_0_end = np.atleast_1d(np.asarray(R_0_end, dtype=float))
+        # past 40/k days from the last inflection point the logistic is flat to double precision
+        self.horizon = self.x0.max() + 40 / self.k if self.k > 0 else 0.0
+
+    def __call__(self, t):
+        return staged_R_0(t, self.R_0_start, self.k, self.x0, self.R_0_end)
+
+    def with_policies(self, policies, k=None):
+        # a single logistic stage folds policies in exactly, like the dashboard always has
+        if len(self.x0) == 1 and (k is None or k == self.k):
+            x0, R_0_end = fold_policies(self.R_0_start, self.x0[0], self.R_0_end[0], policies)
+            return LogisticSchedule(self.R_0_start, self.k, x0, R_0_end)
+        return R0Schedule.with_policies(self, policies, self.k if k is None else k)
+
+def _points(days, values):
+    """Checks the (days, values) points of a schedule; returns them as float arrays."""
+    days = np.asarray(days, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if days.ndim != 1 or len(days) == 0:
+        raise ValueError('An R0 schedule needs a non-empty list of days')
+    if values.shape != days.shape:
+        raise ValueError('An R0 schedule needs one value per day ({} days, {} values)'.format(len(days), values.size))
+    if np.any(np.diff(days) <= 0):
+        raise ValueError('The days of an R0 schedule must be increasing')
+    return days, values
+
+class PiecewiseConstantSchedule(R0Schedule):
+    """R0 that jumps to values[i] on days[i] (values[0] applies before days[0] too)."""
+
+    def __init__(self, days, values):
+        self.days, self.values = _points(days, values)
+        self.horizon = self.days[-1]
+
+    def __call__(self, t):
+        index = np.clip(np.searchsorted(self.days, t, side='right') - 1, 0, len(self.values) - 1)
+        return self.values[index]
+
+class SplineSchedule(R0Schedule):
+    """Smooth curve through (days, values), held constant outside the given days.
+
+    Uses monotone cubic (PCHIP) interpolation, so the curve never overshoots the
+    given values (and so never dips below zero between positive points).
+    """
+
+    def __init__(self, days, values):
+        self.days, values = _points(days, values)
+        self._spline = PchipInterpolator(self.days, values)
+        self.horizon = self.days[-1]
+
+    def __call__(self, t):
+        return self._spline(np.clip(t, self.days[0], self.days[-1]))
+
+class ArraySchedule(R0Schedule):
+    """User-supplied R0 values (e.g. estimated from data), linearly interpolated between days."""
+
+    def __init__(self, days, values):
+        self.days, self.values = _points(days, values)
+        self.horizon = self.days[-1]
+
+    def __call__(self, t):
+        return np.interp(t, self.days, self.values)
+
+class PolicySchedule(R0Schedule):
+    """Another schedule, lowered by each policy's decrement phased in around its onset day."""
+
+    def __init__(self, base, policies, k=1.0):
+        self.base = base
+        self.k = float(k)
+        self.onsets = np.array([policy.onset for policy in policies], dtype=float)
+        self.decrements = np.array([policy.decrement for policy in policies], dtype=float)
+        self.horizon = max(base.horizon, self.onsets.max() + 40 / self.k if len(self.onsets) else 0.0)
+
+    def __call__(self, t):
+        steps = 1 / (1 + np.exp(-self.k * np.subtract.outer(t, self.onsets)))
+        return np.maximum(self.base(t) - np.sum(self.decrements * steps, axis=-1), 0.0)
+
+# schedule types that can be named in a scenario config
+SCHEDULES = {
+    'logistic': LogisticSchedule,
+    'piecewise': PiecewiseConstantSchedule,
+    'spline': SplineSchedule,
+    'array': ArraySchedule,
+}
+
+def make_schedule(spec):
+    """Builds a schedule from a config dict such as {'type': 'piecewise', 'days': [0, 30], 'values': [6, 2]}.
+
+    Parameters
+    ----------
+    spec : dict or R0Schedule
+        'type' is a key of SCHEDULES; the remaining keys are passed to its constructor
+
+    Returns
+    ----------
+    R0Schedule
+
+    Raises
+    ----------
+    ValueError
+        For an unknown type, or days that are empty, not increasing or not matched
+        one-to-one by values
+    """
+    if isinstance(spec, R0Schedule):
+        return spec
+    spec = dict(spec)
+    kind = spec.pop('type')
+    if kind not in SCHEDULES:
+        raise ValueError('Unknown R0 schedule type: {} (choose from {})'.format(kind, ', '.join(SCHEDULES)))
+    return SCHEDULES[kind](**spec)
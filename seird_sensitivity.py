@@ -0,0 +1,239 @@
+# Global sensitivity analysis (Sobol and Morris) of SEIRD outputs over the model parameters
+import numpy as np
+from scipy.stats import qmc
+from seird_metrics import peak_infections, peak_day, cumulative_deaths
+from seird_sweep import sweep
+
+# plausible ranges of the parameters the dashboard exposes
+BOUNDS = {
+    'alpha': (0.0, 1.0),
+    'gamma': (1.0 / 14, 1.0 / 2),
+    'delta': (1.0 / 14, 1.0 / 2),
+    'rho': (1.0 / 21, 1.0 / 5),
+    'R_0_start': (1.0, 8.0),
+    'k': (0.1, 2.0),
+    'x0': (10.0, 90.0),
+    'R_0_end': (0.5, 6.0),
+}
+
+# scalar outputs of a (n_scenarios, len(t), 5) result block over the time grid t
+OUTPUTS = {
+    'peak_infections': lambda ret, t: peak_infections(ret),
+    'peak_day': lambda ret, t: peak_day(ret, t).astype(float),
+    'total_deaths': lambda ret, t: cumulative_deaths(ret),
+}
+
+def _scale(unit, bounds):
+    """Maps points in the unit hypercube onto the parameter ranges."""
+    return {name: low + unit[:, j] * (high - low) for j, (name, (low, high)) in enumerate(bounds.items())}
+
+def _evaluate(samples, t, outputs, block_size, **sweep_kwargs):
+    """Runs the samples through `seird_sweep.sweep` block by block and keeps only the outputs."""
+    n = len(next(iter(samples.values())))
+    values = {name: np.empty(n) for name in outputs}
+    for start in range(0, n, block_size):
+        block = {name: column[start:start + block_size] for name, column in samples.items()}
+        ret = sweep(block, t, **sweep_kwargs)
+        for name in outputs:
+            values[name][start:start + block_size] = OUTPUTS[name](ret, t)
+    return values
+
+def saltelli_sample(bounds, n, seed=None):
+    """Builds the Saltelli design for first-order and total Sobol indices.
+
+    Two independent scrambled Sobol' sample matrices A and B (n rows each) are drawn,
+    and for every parameter i a matrix AB_i that is A with column i taken from B.
+
+    Parameters
+    ----------
+    bounds : dict
+        Parameter name -> (low, high)
+
+    n : int
+        Base sample size (a power of 2 keeps the Sobol' sequence balanced)
+
+    seed : int
+        Seed for the scrambling
+
+    Returns
+    ----------
+    dict
+        Parameter name -> ndarray of shape (n * (len(bounds) + 2),), rows ordered A, B, AB_1, ..., AB_d
+    """
+    d = len(bounds)
+    base = qmc.Sobol(2 * d, seed=seed).random(n)
+    A, B = base[:, :d], base[:, d:]
+    blocks = [A, B]
+    for i in range(d):
+        AB = A.copy()
+        AB[:, i] = B[:, i]
+        blocks.append(AB)
+    return _scale(np.concatenate(blocks), bounds)
+
+def sobol_indices(y, d):
+    """Computes first-order (Saltelli 2010) and total (Jansen) Sobol indices.
+
+    Parameters
+    ----------
+    y : ndarray
+        Model output for every row of a `saltelli_sample` design
+
+    d : int
+        Number of parameters
+
+    Returns
+    ----------
+    S1, ST : ndarray
+        First-order and total index of each parameter
+    """
+    y = np.asarray(y, dtype=float).reshape(d + 2, -1)
+    fA, fB, fAB = y[0], y[1], y[2:]
+    variance = np.var(np.concatenate([fA, fB]))
+    if variance == 0:
+        return np.zeros(d), np.zeros(d)
+    S1 = np.mean(fB * (fAB - fA), axis=1) / variance
+    ST = 0.5 * np.mean((fA - fAB) ** 2, axis=1) / variance
+    return S1, ST
+
+def sobol(t, n=1024, bounds=None, outputs=('peak_infections', 'total_deaths'), seed=None, block_size=50000,
+          **sweep_kwargs):
+    """Sobol sensitivity of SEIRD outputs to the parameters in `bounds`.
+
+    Costs n * (len(bounds) + 2) model runs, integrated as vectorized batches through
+    `seird_sweep.sweep` (and so spread over its process pool); only the scalar
+    outputs of each block are kept, so memory use doesn't grow with n.
+
+    Parameters
+    ----------
+    t : ndarray
+        Grid of time points (in days)
+
+    n : int
+        Base sample size, see `saltelli_sample`
+
+    bounds : dict
+        Parameter name -> (low, high), default BOUNDS; parameters left out keep
+        their `seird_sweep.DEFAULTS`
+
+    outputs : sequence of str
+        Keys of OUTPUTS to analyse
+
+    seed : int
+        Seed for the sample
+
+    block_size : int
+        Number of model runs integrated and reduced at a time
+
+    **sweep_kwargs :
+        Passed on to `seird_sweep.sweep` (chunk_size, workers, steps_per_day, ...)
+
+    Returns
+    ----------
+    dict
+        Output name -> {'S1': ndarray, 'ST': ndarray}, one value per parameter in the
+        order of bounds
+    """
+    bounds = BOUNDS if bounds is None else bounds
+    values = _evaluate(saltelli_sample(bounds, n, seed), t, outputs, block_size, **sweep_kwargs)
+    result = {}
+    for name in outputs:
+        S1, ST = sobol_indices(values[name], len(bounds))
+        result[name] = {'S1': S1, 'ST': ST}
+    return result
+
+def morris_sample(bounds, r, levels=4, seed=None):
+    """Builds r Morris trajectories of one-at-a-time steps through the parameter space.
+
+    Each trajectory starts on a point of the `levels`-level grid and moves every
+    parameter once, in random order and direction, by delta = levels / (2 (levels - 1))
+    of its range.
+
+    Parameters
+    ----------
+    bounds : dict
+        Parameter name -> (low, high)
+
+    r : int
+        Number of trajectories
+
+    levels : int
+        Number of grid levels (even)
+
+    seed : int
+        Seed for np.random.default_rng
+
+    Returns
+    ----------
+    samples : dict
+        Parameter name -> ndarray of shape (r * (len(bounds) + 1),)
+
+    steps : ndarray
+        (r, d) array: steps[j, m] is the signed index (parameter + 1, negative for a
+        downward step) of the parameter changed in the m-th step of trajectory j
+    """
+    rng = np.random.default_rng(seed)
+    d = len(bounds)
+    delta = levels / (2.0 * (levels - 1))
+    points = np.empty((r, d + 1, d))
+    steps = np.empty((r, d), dtype=int)
+    for j in range(r):
+        signs = rng.choice([-1, 1], d)
+        x = rng.integers(0, levels // 2, d) / (levels - 1.0)
+        x = np.where(signs < 0, x + delta, x)
+        points[j, 0] = x
+        for m, i in enumerate(rng.permutation(d)):
+            x = x.copy()
+            x[i] += signs[i] * delta
+            points[j, m + 1] = x
+            steps[j, m] = signs[i] * (i + 1)
+    return _scale(points.reshape(-1, d), bounds), steps
+
+def morris_indices(y, steps, levels=4):
+    """Computes the Morris screening measures from the outputs of a `morris_sample` design.
+
+    Parameters
+    ----------
+    y : ndarray
+        Model output for every row of the design
+
+    steps : ndarray
+        As returned by `morris_sample`
+
+    levels : int
+        Number of grid levels used for the design
+
+    Returns
+    ----------
+    mu, mu_star, sigma : ndarray
+        Mean, mean absolute value and standard deviation of each parameter's
+        elementary effects (in output units per unit of the normalized range)
+    """
+    r, d = steps.shape
+    delta = levels / (2.0 * (levels - 1))
+    y = np.asarray(y, dtype=float).reshape(r, d + 1)
+    effects = np.empty((r, d))
+    rows = np.arange(r)[:, None]
+    index = np.abs(steps) - 1
+    effects[rows, index] = np.diff(y, axis=1) / (np.sign(steps) * delta)
+    return effects.mean(axis=0), np.abs(effects).mean(axis=0), effects.std(axis=0, ddof=1)
+
+def morris(t, r=100, bounds=None, outputs=('peak_infections', 'total_deaths'), levels=4, seed=None,
+           block_size=50000, **sweep_kwargs):
+    """Morris screening of SEIRD outputs: a cheap ranking of the parameters in `bounds`.
+
+    Costs r * (len(bounds) + 1) model runs; see `sobol` for the arguments.
+
+    Returns
+    ----------
+    dict
+        Output name -> {'mu': ndarray, 'mu_star': ndarray, 'sigma': ndarray}, one value
+        per parameter in the order of bounds
+    """
+    bounds = BOUNDS if bounds is None else bounds
+    samples, steps = morris_sample(bounds, r, levels, seed)
+    values = _evaluate(samples, t, outputs, block_size, **sweep_kwargs)
+    result = {}
+    for name in outputs:
+        mu, mu_star, sigma = morris_indices(values[name], steps, levels)
+        result[name] = {'mu': mu, 'mu_star': mu_star, 'sigma': sigma}
+    return result
@@ -0,0 +1,257 @@
+# Local HTTP service that evaluates SEIRD scenarios, batching concurrent requests
+#
+# Usage: python -m seird_service [--host 127.0.0.1] [--port 8080] [--window 0.01]
+#
+#     curl -d '{"mortality_rate": 0.2, "policies": ["schools"]}' localhost:8080/simulate
+#     curl -d '{}' 'localhost:8080/simulate?format=npz' > result.npz
+#
+# Requests that arrive within `window` seconds of each other are integrated together as
+# one vectorized batch, so under load the solver cost is shared across requests.
+import argparse
+import asyncio
+import io
+import json
+import logging
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from seird import scenario_args, scenario_schedule, DEFAULT_PARAMS
+from seird_batch import batch_table_deriv, rk4_steps
+
+logger = logging.getLogger('seird')
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+MAX_BODY = 1 << 20
+
+# longest horizon (days) a request may ask for, through 'days' or its R0 schedule
+MAX_DAYS = 3650
+
+# settings that must be positive, finite numbers (the periods are divided by)
+POSITIVE = ('population', 'contagious_period', 'incubation_time', 'infection_to_death')
+
+def validate(params):
+    """Checks the settings a batch can't recover from, so one bad request can't fail its whole batch.
+
+    Raises
+    ----------
+    ValueError
+        If params isn't an object, a population or period isn't a positive finite
+        number, days isn't an integer of at least 1, or days or the R0 schedule
+        reach past MAX_DAYS
+    """
+    if not isinstance(params, dict):
+        raise ValueError('The scenario must be a JSON object')
+    p = dict(DEFAULT_PARAMS, **params)
+    for name in POSITIVE:
+        value = float(p[name])
+        if not (np.isfinite(value) and value > 0):
+            raise ValueError('{} must be a positive number'.format(name))
+    days = p['days']
+    if isinstance(days, bool) or not isinstance(days, (int, float)) or days != int(days) or days < 1:
+        raise ValueError('days must be an integer of at least 1')
+    if days > MAX_DAYS:
+        raise ValueError('days must be at most {}'.format(MAX_DAYS))
+    # the R0 table is tabulated up to the schedule's horizon, whatever days is
+    if not scenario_schedule(params).horizon <= MAX_DAYS:
+        raise ValueError('The R0 schedule must settle within {} days'.format(MAX_DAYS))
+
+def run_batch(scenarios, steps_per_day=10):
+    """Integrates several scenarios together with the vectorized RK4 solver.
+
+    Parameters
+    ----------
+    scenarios : list of tuple
+        (y0, args, days, schedule) per scenario, from `seird.scenario_args`
+
+    steps_per_day : int
+        Number of RK4 steps per day
+
+    Returns
+    ----------
+    list of dict
+        Arrays 't', 'S', 'E', 'I', 'R', 'D' and 'R0' per scenario, as from `seird.simulate`
+    """
+    results = [None] * len(scenarios)
+    # scenarios can only share a batch if their R0 tables share a grid; they are also grouped
+    # by table length within a factor of two, so a long scenario doesn't stretch short ones
+    groups = {}
+    for i, (y0, args, days, schedule) in enumerate(scenarios):
+        groups.setdefault(args[5:7] + (len(args[7]).bit_length(),), []).append(i)
+    for (t0, dt, _), members in groups.items():
+        days = [int(scenarios[i][2]) for i in members]
+        t = np.arange(max(days), dtype=float)
+        length = max(len(scenarios[i][1][7]) for i in members)
+        tables = np.empty((length, len(members)))
+        for column, i in enumerate(members):
+            table = scenarios[i][1][7]
+            tables[:len(table), column] = table
+            tables[len(table):, column] = table[-1]
+        N, gamma, delta, alpha, rho = np.array([scenarios[i][1][:5] for i in members]).T
+        y0 = np.array([scenarios[i][0] for i in members], dtype=float)
+        ret = np.empty((len(members), len(t), 5))
+        for j, y in enumerate(rk4_steps(batch_table_deriv, y0, t, (N, gamma, delta, alpha, rho, t0, dt, tables),
+                                        steps_per_day)):
+            ret[:, j] = y
+        for column, i in enumerate(members):
+            t_i = t[:days[column]]
+            S, E, I, R, D = ret[column, :days[column]].T
+            results[i] = {'t': t_i, 'S': S, 'E': E, 'I': I, 'R': R, 'D': D, 'R0': scenarios[i][3](t_i)}
+    return results
+
+class Batcher:
+    """Collects scenarios submitted within a short window and integrates them as one batch.
+
+    Parameters
+    ----------
+    window : float
+        Seconds to wait after the first pending request for others to join its batch
+
+    max_batch : int
+        Batch size at which a batch starts at once, without waiting for the window
+
+    steps_per_day : int
+        Number of RK4 steps per day
+    """
+
+    def __init__(self, window=0.01, max_batch=1024, steps_per_day=10):
+        self.window = window
+        self.max_batch = max_batch
+        self.steps_per_day = steps_per_day
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+
+    async def submit(self, params):
+        """Evaluates one scenario; raises ValueError for invalid settings."""
+        validate(params)
+        scenario = scenario_args(params)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((scenario, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self.batches += 1
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            # integrate off the event loop, so new requests keep queuing for the next batch
+            results = await loop.run_in_executor(None, run_batch, [s for s, _ in batch], self.steps_per_day)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+def encode(result, fmt):
+    """Serializes a result as JSON lists, or as an .npz archive (format 'npz')."""
+    if fmt == 'npz':
+        buffer = io.BytesIO()
+        np.savez(buffer, **result)
+        return buffer.getvalue(), 'application/octet-stream'
+    return json.dumps({name: values.tolist() for name, values in result.items()}).encode(), 'application/json'
+
+async def _respond(writer, status, body, content_type='application/json'):
+    head = 'HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'.format(
+        status, REASONS[status], content_type, len(body))
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+    writer.close()
+
+def _error(message):
+    return json.dumps({'error': message}).encode()
+
+async def handle(batcher, reader, writer):
+    """Serves one HTTP request: POST /simulate with scenario JSON, or GET /health."""
+    try:
+        method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    except (ValueError, ConnectionError):
+        writer.close()
+        return
+
+    url = urlsplit(target)
+    if url.path == '/health':
+        await _respond(writer, 200, json.dumps({'status': 'ok', 'batches': batcher.batches}).encode())
+        return
+    if url.path != '/simulate':
+        await _respond(writer, 404, _error('Unknown path: {}'.format(url.path)))
+        return
+    if method != 'POST':
+        await _respond(writer, 405, _error('Use POST'))
+        return
+    fmt = parse_qs(url.query).get('format', ['npz' if 'npz' in headers.get('accept', '') else 'json'])[0]
+    try:
+        try:
+            length = headers.get('content-length', '0')
+            if not length.isdigit():
+                raise ValueError('Invalid Content-Length: {}'.format(length))
+            length = int(length)
+            if length > MAX_BODY:
+                await _respond(writer, 413, _error('Request body too large'))
+                return
+            params = json.loads(await reader.readexactly(length) or b'{}')
+            result = await batcher.submit(params)
+        except asyncio.IncompleteReadError:
+            await _respond(writer, 400, _error('Request body shorter than its Content-Length'))
+            return
+        except (ValueError, TypeError, KeyError, ArithmeticError) as e:
+            await _respond(writer, 400, _error(str(e)))
+            return
+        body, content_type = encode(result, fmt)
+        await _respond(writer, 200, body, content_type)
+    except ConnectionError:
+        writer.close()
+    except Exception:
+        # never leave a client hanging without an answer
+        logger.exception('Failed to serve %s %s', method, target)
+        try:
+            await _respond(writer, 500, _error('Internal server error'))
+        except ConnectionError:
+            writer.close()
+
+async def serve(host='127.0.0.1', port=8080, window=0.01, max_batch=1024, steps_per_day=10):
+    """Runs the service until cancelled."""
+    batcher = Batcher(window, max_batch, steps_per_day)
+    server = await asyncio.start_server(lambda r, w: handle(batcher, r, w), host, port)
+    logger.info('Serving SEIRD scenarios on http://%s:%d/simulate', host, port)
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(prog='python -m seird_service', description='Local SEIRD scenario service')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: localhost only)')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--window', type=float, default=0.01, help='seconds to collect requests into one batch')
+    parser.add_argument('--max-batch', type=int, default=1024, help='largest batch integrated at once')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.host, args.port, args.window, args.max_batch))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+# Solver backends for the SEIRD equations, with an automatic choice between them
+from collections import namedtuple
+import numpy as np
+from scipy.integrate import odeint, solve_ivp
+from seird_batch import rk4_steps
+from seird_profile import counted, solver_info
+
+# result of `solve`: y has shape (len(t),) + y0.shape; sol, t_events and y_events are
+# only set by the solve_ivp methods (when dense output or events are requested)
+Solution = namedtuple('Solution', ['t', 'y', 'method', 'nfev', 'sol', 't_events', 'y_events'])
+
+METHODS = ('odeint', 'RK45', 'LSODA', 'BDF', 'rk4')
+
+# Stiffness ratio above which explicit methods are not worth trying
+STIFF_RATIO = 1000.0
+
+def stiffness_ratio(func, y0, t, args=(), jac=None):
+    """Estimates how stiff the problem is at its initial state.
+
+    The ratio is the largest decay rate of the Jacobian times the length of the
+    integration interval, i.e. roughly how many steps an explicit method would be
+    forced to take for stability alone.
+
+    Parameters
+    ----------
+    func : function
+        Right hand side, called as func(y, t, *args)
+
+    y0 : ndarray
+        Initial state (a single scenario)
+
+    t : ndarray
+        Grid of time points (in days)
+
+    args : tuple
+        Extra arguments passed on to func and jac
+
+    jac : function
+        Jacobian, called as jac(y, t, *args); estimated by finite differences if None
+
+    Returns
+    ----------
+    float
+    """
+    y0 = np.asarray(y0, dtype=float)
+    if jac is not None:
+        J = np.asarray(jac(y0, t[0], *args))
+    else:
+        f0 = np.asarray(func(y0, t[0], *args))
+        J = np.empty((len(y0), len(y0)))
+        for j in range(len(y0)):
+            h = 1e-7 * max(abs(y0[j]), 1.0)
+            y = y0.copy()
+            y[j] += h
+            J[:, j] = (np.asarray(func(y, t[0], *args)) - f0) / h
+    return float(np.max(np.abs(np.linalg.eigvals(J)))) * (t[-1] - t[0])
+
+def _rk4_steps_for(func, y0, t, args, rtol, atol, steps_per_day=1, max_steps_per_day=1024):
+    """Picks the number of RK4 steps per day by step doubling over t.
+
+    Doubles the steps per day until the coarse and fine solutions agree to within the
+    tolerances at every point of t (their difference estimates the error of the coarse
+    one), so it costs about as much as the integration it tunes; pass the result as
+    steps_per_day when the same kind of batch is solved repeatedly.
+
+    Returns
+    ----------
+    steps_per_day : int
+
+    y : ndarray
+        The accepted (len(t),) + y0.shape solution, so it needn't be integrated again
+    """
+    coarse = _rk4_grid(func, y0, t, args, steps_per_day)
+    while steps_per_day < max_steps_per_day:
+        fine = _rk4_grid(func, y0, t, args, 2 * steps_per_day)
+        if np.all(np.abs(fine - coarse) <= atol + rtol * np.abs(fine)):
+            return steps_per_day, coarse
+        steps_per_day *= 2
+        coarse = fine
+    return steps_per_day, coarse
+
+def _rk4_grid(func, y0, t, args, steps_per_day):
+    """Returns the RK4 states at every point of t."""
+    y = np.empty((len(t),) + np.shape(y0))
+    for i, state in enumerate(rk4_steps(func, y0, t, args, steps_per_day)):
+        y[i] = state
+    return y
+
+def _flatten(func, shape):
+    """Wraps a batched right hand side so that it takes and returns flat vectors."""
+    return lambda y, t, *args: np.asarray(func(y.reshape(shape), t, *args)).ravel()
+
+def select_method(func, y0, t, args=(), jac=None, dense_output=False, events=None):
+    """Picks the backend `solve(method='auto')` uses.
+
+    The choice follows the timings of benchmarks/bench_seird.py: batches of scenarios
+    are fastest with the vectorized RK4; a single scenario is fastest with odeint
+    (compiled LSODA, which also switches to a stiff method by itself); dense output
+    and events need solve_ivp, where RK45 wins on non-stiff problems and LSODA on
+    stiff ones.
+
+    Returns
+    ----------
+    str
+        One of METHODS
+    """
+    y0 = np.asarray(y0, dtype=float)
+    if dense_output or events:
+        if y0.ndim > 1:
+            return 'RK45'
+        return 'LSODA' if stiffness_ratio(func, y0, t, args, jac) > STIFF_RATIO else 'RK45'
+    return 'rk4' if y0.ndim > 1 else 'odeint'
+
+def solve(func, y0, t, args=(), method='auto', rtol=None, atol=None, jac=None, dense_output=False, events=None,
+          steps_per_day=None):
+    """Integrates func over the time grid t with the chosen backend.
+
+    Parameters
+    ----------
+    func : function
+        Right hand side in the odeint convention, func(y, t, *args); y may be a batch
+        (e.g. (n_scenarios, 5) for `seird_batch.batch_deriv`)
+
+    y0 : ndarray
+        Initial state
+
+    t : ndarray
+        Grid of time points (in days) to report the solution at
+
+    args : tuple
+        Extra arguments passed on to func and jac
+
+    method : str
+        'odeint', 'RK45', 'LSODA', 'BDF', 'rk4' (fixed-step, vectorized) or 'auto'
+        (see `select_method`)
+
+    rtol, atol : float
+        Relative and absolute tolerances (backend defaults if None). For 'rk4' they
+        pick the step size when steps_per_day isn't given.
+
+    jac : function
+        Jacobian in the odeint convention, jac(y, t, *args); used by odeint, LSODA and BDF
+
+    dense_output : bool
+        Also return a continuous solution `sol(t)` (solve_ivp methods only)
+
+    events : function or list of functions
+        Event functions event(t, y) in the solve_ivp convention (solve_ivp methods only);
+        set `terminal = True` on one to stop the integration there
+
+    steps_per_day : int
+        Number of RK4 steps per day
+
+    Returns
+    ----------
+    Solution
+    """
+    y0 = np.asarray(y0, dtype=float)
+    t = np.asarray(t, dtype=float)
+    if method == 'auto':
+        method = select_method(func, y0, t, args, jac, dense_output, events)
+    if method not in METHODS:
+        raise ValueError('Unknown method: {} (choose from auto, {})'.format(method, ', '.join(METHODS)))
+    if (dense_output or events) and method in ('odeint', 'rk4'):
+        raise ValueError('dense_output and events need one of the solve_ivp methods (RK45, LSODA, BDF)')
+    func = counted(func, 'rhs')
+    jac = counted(jac, 'jac')
+
+    if method == 'rk4':
+        if steps_per_day is None and (rtol is not None or atol is not None):
+            steps_per_day, y = _rk4_steps_for(func, y0, t, args, rtol or 1e-6, atol or 1e-6)
+        else:
+            steps_per_day = 10 if steps_per_day is None else steps_per_day
+            y = _rk4_grid(func, y0, t, args, steps_per_day)
+        n_steps = sum(max(1, int(np.ceil(h * steps_per_day))) for h in np.diff(t))
+        solver_info(method, nfev=4 * n_steps, nsteps=n_steps, steps_per_day=steps_per_day)
+        return Solution(t, y, method, 4 * n_steps, None, None, None)
+
+    if method == 'odeint':
+        kwargs = {'rtol': rtol, 'atol': atol}
+        if jac is not None and y0.ndim == 1:
+            kwargs['Dfun'] = jac
+        if y0.ndim > 1:
+            func = _flatten(func, y0.shape)
+        y, info = odeint(func, y0.ravel(), t, args=tuple(args), full_output=True, **kwargs)
+        solver_info(method, nfev=int(info['nfe'][-1]), njev=int(info['nje'][-1]), nsteps=int(info['nst'][-1]),
+                    stiff_intervals=int(np.sum(info['mused'] == 2)))
+        return Solution(t, y.reshape((len(t),) + y0.shape), method, int(info['nfe'][-1]), None, None, None)
+
+    kwargs = {}
+    if rtol is not None:
+        kwargs['rtol'] = rtol
+    if atol is not None:
+        kwargs['atol'] = atol
+    if jac is not None and method != 'RK45' and y0.ndim == 1:
+        kwargs['jac'] = lambda s, y: jac(y, s, *args)
+    if y0.ndim > 1:
+        func = _flatten(func, y0.shape)
+    fun = lambda s, y: func(y, s, *args)
+    result = solve_ivp(fun, (t[0], t[-1]), y0.ravel(), method=method, t_eval=t, dense_output=dense_output,
+                       events=events, **kwargs)
+    if result.status < 0:
+        raise RuntimeError(result.message)
+    solver_info(method, nfev=int(result.nfev), njev=int(result.njev), nlu=int(result.nlu))
+    y = result.y.T.reshape((len(result.t),) + y0.shape)
+    return Solution(result.t, y, method, result.nfev, result.sol, result.t_events, result.y_events)
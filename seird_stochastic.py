@@ -0,0 +1,71 @@
+# Stochastic SEIRD model: tau-leaping with many Monte Carlo replicates at once
+import numpy as np
+from seird_utils import logistic_R_0
+
+def tau_leap(y0, t, N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end, n_replicates=1000,
+             steps_per_day=4, quantiles=(0.05, 0.5, 0.95), seed=None):
+    """Simulates the S→E→I→R/D transitions as a chain-binomial (tau-leaping) process.
+
+    All replicates are advanced together as integer count vectors. In each leap of
+    length tau, every person in a compartment leaves it with probability
+    1 - exp(-rate * tau), and people leaving I are split between R and D with a
+    multinomial draw, so counts never go negative. Only the quantiles across
+    replicates are kept for each point of t, so memory use is O(n_replicates + len(t)).
+
+    Parameters
+    ----------
+    y0 : tuple
+        Initial S, E, I, R, D counts
+
+    t : ndarray
+        Grid of time points (in days) to report quantiles at
+
+    N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end : float
+        See `seird_utils.deriv`
+
+    n_replicates : int
+        Number of Monte Carlo replicates
+
+    steps_per_day : int
+        Minimum number of leaps per day
+
+    quantiles : tuple
+        Quantiles to report, between 0 and 1
+
+    seed : int or np.random.SeedSequence
+        Seed for np.random.default_rng; the same seed reproduces the same envelopes
+
+    Returns
+    ----------
+    envelopes : ndarray
+        (len(quantiles), len(t), 5) array of S, E, I, R, D quantiles across replicates
+    """
+    rng = np.random.default_rng(seed)
+    t = np.asarray(t, dtype=float)
+    y = np.tile(np.asarray(y0, dtype=np.int64), (n_replicates, 1))
+    envelopes = np.empty((len(quantiles), len(t), 5))
+    envelopes[:, 0, :] = np.quantile(y, quantiles, axis=0)
+
+    # chance that a person leaving I dies rather than recovers
+    leave_I = (1 - alpha) * gamma + alpha * rho
+    p_death = alpha * rho / leave_I if leave_I > 0 else 0.0
+    for i, (t_start, t_stop) in enumerate(zip(t[:-1], t[1:]), start=1):
+        n_steps = max(1, int(np.ceil((t_stop - t_start) * steps_per_day)))
+        tau = (t_stop - t_start) / n_steps
+        p_E = -np.expm1(-delta * tau)
+        p_I = -np.expm1(-leave_I * tau)
+        for step in range(n_steps):
+            s = t_start + step * tau
+            beta = logistic_R_0(s, R_0_start, k, x0, R_0_end) * gamma
+            p_S = -np.expm1(-beta * y[:, 2] / N * tau)
+            infected = rng.binomial(y[:, 0], p_S)
+            onset = rng.binomial(y[:, 1], p_E)
+            leaving = rng.binomial(y[:, 2], p_I)
+            died = rng.binomial(leaving, p_death)
+            y[:, 0] -= infected
+            y[:, 1] += infected - onset
+            y[:, 2] += onset - leaving
+            y[:, 3] += leaving - died
+            y[:, 4] += died
+        envelopes[:, i, :] = np.quantile(y, quantiles, axis=0)
+    return envelopes
@@ -0,0 +1,155 @@
+# Columnar, memory-mapped storage for large ensembles of SEIRD results
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+
+COMPARTMENTS = ('S', 'E', 'I', 'R', 'D')
+
+class ResultStore:
+    """A directory of memory-mapped .npy columns holding an ensemble of scenario results.
+
+    Every compartment is stored in its own (n_scenarios, n_days) file, and every scenario
+    parameter in its own (n_scenarios,) file, so a query only reads the columns it
+    uses, and within them only the rows it selects. Nothing is loaded into RAM
+    until it is indexed.
+
+    A store can be passed as `out` to `seird_sweep.sweep`, which writes each finished
+    chunk straight to disk:
+
+        store = ResultStore.create('ensemble', samples, t)
+        sweep(samples, t, out=store)
+        peaks = store.reduce('I', np.max, rows=store.param('alpha') > 0.2)
+
+    Parameters
+    ----------
+    path : str
+        Directory of an existing store
+
+    mode : str
+        'r' to open read-only, 'r+' to allow writing results
+    """
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.t = np.array(meta['t'])
+        self.n_scenarios = meta['n_scenarios']
+        self.param_names = tuple(meta['params'])
+        self._columns = {name: open_memmap(os.path.join(path, name + '.npy'), mode=mode) for name in COMPARTMENTS}
+        self._params = {name: open_memmap(os.path.join(path, 'param_' + name + '.npy'), mode='r')
+                        for name in self.param_names}
+
+    @classmethod
+    def create(cls, path, samples, t, dtype=np.float64):
+        """Creates an empty store for one result per scenario in `samples`.
+
+        Parameters
+        ----------
+        path : str
+            Directory to create the store in
+
+        samples : dict
+            Parameter name -> ndarray of shape (n_scenarios,), saved as the parameter index
+
+        t : ndarray
+            Grid of time points (in days) of every result
+
+        dtype : numpy dtype
+            Storage type of the results; float32 halves the disk space
+
+        Returns
+        ----------
+        ResultStore
+            The new store, open for writing
+        """
+        os.makedirs(path, exist_ok=True)
+        n_scenarios = len(next(iter(samples.values())))
+        t = np.asarray(t, dtype=float)
+        for name, values in samples.items():
+            column = open_memmap(os.path.join(path, 'param_' + name + '.npy'), mode='w+',
+                                 dtype=np.float64, shape=(n_scenarios,))
+            column[:] = values
+            column.flush()
+        for name in COMPARTMENTS:
+            open_memmap(os.path.join(path, name + '.npy'), mode='w+', dtype=dtype, shape=(n_scenarios, len(t))).flush()
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'n_scenarios': n_scenarios, 't': t.tolist(), 'params': list(samples)}, f)
+        return cls(path, mode='r+')
+
+    def __len__(self):
+        return self.n_scenarios
+
+    def __setitem__(self, rows, ret):
+        """Writes results given as an (n, n_days, 5) array, like a regular result array."""
+        for i, name in enumerate(COMPARTMENTS):
+            self._columns[name][rows] = ret[..., i]
+
+    def __getitem__(self, rows):
+        """Reads results back as an (n, n_days, 5) array."""
+        return np.stack([self._columns[name][rows] for name in COMPARTMENTS], axis=-1)
+
+    def param(self, name):
+        """Returns the (memory-mapped) values of one scenario parameter."""
+        return self._params[name]
+
+    def column(self, name, rows=None):
+        """Returns the results of one compartment.
+
+        Parameters
+        ----------
+        name : str
+            One of COMPARTMENTS
+
+        rows : slice, ndarray of int or bool
+            Scenarios to read (all of them if None, as a memory map)
+
+        Returns
+        ----------
+        ndarray
+            (n_rows, n_days) array
+        """
+        column = self._columns[name]
+        return column if rows is None else column[rows]
+
+    def reduce(self, name, func, rows=None, chunk_size=10000):
+        """Applies a per-scenario reduction (e.g. np.max) to one compartment, chunk by chunk.
+
+        Only chunk_size rows are in memory at a time, so the reduction works on
+        ensembles much larger than RAM.
+
+        Parameters
+        ----------
+        name : str
+            One of COMPARTMENTS
+
+        func : function
+            Reduction called as func(values, axis=1) on an (n_rows, n_days) block,
+            e.g. np.max or np.argmax
+
+        rows : ndarray of int or bool
+            Scenarios to include (all of them if None)
+
+        chunk_size : int
+            Number of rows read at a time
+
+        Returns
+        ----------
+        ndarray
+            One value per selected scenario
+        """
+        column = self._columns[name]
+        if rows is None:
+            rows = np.arange(self.n_scenarios)
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        return np.concatenate([func(column[rows[i:i + chunk_size]], axis=1)
+                               for i in range(0, len(rows), chunk_size)] or [np.empty(0)])
+
+    def flush(self):
+        """Writes any pending changes to disk."""
+        for column in self._columns.values():
+            if column.mode != 'r':
+                column.flush()
@@ -0,0 +1,73 @@
+# Streaming, incremental time-stepping for long SEIRD horizons
+import itertools
+import numpy as np
+from seird import scenario_args
+from seird_profile import phase
+from seird_solvers import solve
+from seird_utils import table_rhs, table_jac
+
+def stream(params, step=1.0, chunk_size=1000, min_infected=None, max_deaths=None):
+    """Integrates a scenario chunk by chunk, yielding results as it goes.
+
+    Only one chunk is held in memory at a time, so memory use doesn't depend on
+    the horizon. Each chunk continues from the last state of the previous one.
+    The stream ends at the scenario's 'days' horizon, or as soon as an early
+    stopping condition is met (the chunk that meets it is cut just after that point).
+
+    Parameters
+    ----------
+    params : dict
+        Scenario settings, see `seird.simulate`. Setting 'days' to None streams until
+        a stopping condition is met (or the caller stops iterating).
+
+    step : float
+        Spacing of the output points in days, e.g. 1/24 for hourly output
+
+    chunk_size : int
+        Number of output points per chunk
+
+    min_infected : float
+        Stop once the number of infected is falling and has dropped below this value
+
+    max_deaths : float
+        Stop once the number of deceased reaches this value
+
+    Yields
+    ----------
+    t : ndarray
+        Time points (in days) of the chunk
+
+    ret : ndarray
+        (len(t), 5) array of S, E, I, R, D values at those time points
+    """
+    y, args, days, _ = scenario_args(params)
+    n_points = None if days is None else int(round(days / step))
+    last_t = None
+
+    for start in itertools.count(0, chunk_size):
+        n = chunk_size if n_points is None else min(chunk_size, n_points - start)
+        if n <= 0:
+            return
+        # the grid is computed from the point index, so rounding errors don't pile up
+        t = np.arange(start, start + n) * step
+        with phase('integrate'):
+            if last_t is None:
+                ret = solve(table_rhs, y, t, args=args, method='odeint', jac=table_jac).y
+                last_I = ret[0, 2]
+            else:
+                grid = np.concatenate([[last_t], t])
+                ret = solve(table_rhs, y, grid, args=args, method='odeint', jac=table_jac).y[1:]
+
+        done = np.zeros(n, dtype=bool)
+        if min_infected is not None:
+            I = ret[:, 2]
+            falling = I < np.concatenate([[last_I], I[:-1]])
+            done |= falling & (I < min_infected)
+        if max_deaths is not None:
+            done |= ret[:, 4] >= max_deaths
+        if done.any():
+            end = np.argmax(done) + 1
+            yield t[:end], ret[:end]
+            return
+        yield t, ret
+        last_t, y, last_I = t[-1], ret[-1], ret[-1, 2]
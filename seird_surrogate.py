@@ -0,0 +1,220 @@
+# Precomputed surrogate of the SEIRD model for instant what-if answers
+#
+# Offline:  Surrogate.fit().save('surrogate.npz')
+# Online:   surrogate = Surrogate.load('surrogate.npz'); result = surrogate.predict(params)
+import itertools
+import json
+import math
+import numpy as np
+from seird import DEFAULT_PARAMS, scenario_params, simulate, make_policy
+from seird_sweep import sweep
+from seird_utils import fold_policies, logistic_R_0
+
+# grid the surrogate is trained on: (low, high, points, spacing) per axis. The periods
+# are spaced logarithmically, since the trajectories change fastest at short periods;
+# R_0_end is R0 once the policies have phased in, so its range covers every
+# combination of the dashboard policies.
+AXES = {
+    'mortality_rate': (0.0, 1.0, 8, 'linear'),
+    'contagious_period': (2.0, 10.0, 12, 'log'),
+    'incubation_time': (2.0, 10.0, 12, 'log'),
+    'infection_to_death': (5.0, 30.0, 8, 'log'),
+    'R_0_end': (4.3, 6.0, 4, 'linear'),
+}
+
+def _nodes(low, high, points, spacing):
+    """Grid points of one axis."""
+    return np.geomspace(low, high, points) if spacing == 'log' else np.linspace(low, high, points)
+
+def _cubic_weights(nodes, value):
+    """First index and Lagrange weights of the 4-point cubic stencil around value."""
+    j = min(max(int(np.searchsorted(nodes, value)) - 2, 0), len(nodes) - 4)
+    x = nodes[j:j + 4].tolist()
+    weights = [1.0] * 4
+    for a in range(4):
+        for b in range(4):
+            if a != b:
+                weights[a] *= (value - x[b]) / (x[a] - x[b])
+    return j, weights
+
+def _sweep_samples(values, fixed):
+    """Turns surrogate coordinates (n, len(AXES)) into `seird_sweep.sweep` parameters."""
+    mortality_rate, contagious_period, incubation_time, infection_to_death, R_0_end = values.T
+    return {
+        'N': np.full(len(values), float(fixed['population'])),
+        'gamma': 1.0 / contagious_period,
+        'delta': 1.0 / incubation_time,
+        'alpha': mortality_rate,
+        'rho': 1.0 / infection_to_death,
+        'R_0_start': np.full(len(values), float(fixed['R_0_start'])),
+        'k': np.full(len(values), float(fixed['k'])),
+        'x0': np.full(len(values), float(fixed['x0'])),
+        'R_0_end': R_0_end,
+    }
+
+class Surrogate:
+    """Reduced-basis emulator of SEIRD trajectories over a bounded parameter box.
+
+    Every trajectory is compressed to a few principal-component coefficients, and the
+    coefficients are tabulated on a grid over AXES. A query interpolates the
+    coefficients with tensor-product cubics through the 4^5 surrounding grid points
+    (in log coordinates on log-spaced axes) and expands them back into a trajectory,
+    which takes well under a millisecond.
+
+    A query the surrogate wasn't trained for (a coordinate outside the box, different
+    population, days, R_0_start, k or x0, a custom R0 schedule or policies with other
+    onsets) falls back to the exact solver (`seird.simulate`).
+
+    Use `fit` to build one and `load` to read one back from disk.
+    """
+
+    def __init__(self, axes, log_axes, coefficients, mean, basis, t, fixed, error_bound):
+        self.axes = [np.asarray(axis, dtype=float) for axis in axes]
+        self.log_axes = np.asarray(log_axes, dtype=bool)
+        self.coefficients = coefficients
+        self.mean = mean
+        self.basis = basis
+        self.t = t
+        self.fixed = fixed
+        self.error_bound = float(error_bound)
+        # interpolation coordinates of the grid, offsets of a 4^d stencil and strides
+        # into the flattened coefficient grid
+        self._coords = [np.log(axis) if log else axis for axis, log in zip(self.axes, self.log_axes)]
+        self._stencil = np.array(list(itertools.product(range(4), repeat=len(self.axes))))
+        self._flat = coefficients.reshape(-1, coefficients.shape[-1])
+        self._strides = np.array([int(np.prod(coefficients.shape[i + 1:-1])) for i in range(len(self.axes))])
+
+    @classmethod
+    def fit(cls, axes=None, n_components=48, n_test=500, fixed=None, seed=None, **sweep_kwargs):
+        """Samples the parameter box, integrates it and builds the surrogate.
+
+        Parameters
+        ----------
+        axes : dict
+            Overrides for AXES, e.g. {'R_0_end': (1.0, 6.0, 8, 'linear')}; every axis
+            needs at least 4 points
+
+        n_components : int
+            Number of principal components kept per trajectory
+
+        n_test : int
+            Number of random scenarios held out to measure the error bound
+
+        fixed : dict
+            Settings held fixed, overriding seird.DEFAULT_PARAMS (population, R_0_start,
+            k, x0, days)
+
+        seed : int
+            Seed for the held-out scenarios
+
+        **sweep_kwargs :
+            Passed on to `seird_sweep.sweep` (chunk_size, workers, steps_per_day, ...)
+
+        Returns
+        ----------
+        Surrogate
+        """
+        settings = {name: DEFAULT_PARAMS[name] for name in ('population', 'R_0_start', 'k', 'x0', 'days')}
+        settings.update(fixed or {})
+        fixed = {name: float(value) for name, value in settings.items()}
+        specs = dict(AXES, **(axes or {}))
+        specs = [specs[name] for name in AXES]
+        if min(spec[2] for spec in specs) < 4:
+            raise ValueError('Every surrogate axis needs at least 4 points')
+        axes = [_nodes(*spec) for spec in specs]
+        t = np.linspace(0, fixed['days'] - 1, int(fixed['days']))
+        N = fixed['population']
+
+        grid = np.array(list(itertools.product(*axes)))
+        Y = sweep(_sweep_samples(grid, fixed), t, **sweep_kwargs).reshape(len(grid), -1) / N
+        mean = Y.mean(axis=0)
+        Y -= mean
+        _, _, Vt = np.linalg.svd(Y, full_matrices=False)
+        basis = Vt[:n_components]
+        coefficients = (Y @ basis.T).reshape([len(axis) for axis in axes] + [n_components])
+        surrogate = cls(axes, [spec[3] == 'log' for spec in specs], coefficients, mean, basis, t, fixed, 0.0)
+
+        # error bound: worst deviation (in people) over the held-out trajectories
+        rng = np.random.default_rng(seed)
+        low, high = np.array([spec[:2] for spec in specs]).T
+        test = low + rng.random((n_test, len(axes))) * (high - low)
+        exact = sweep(_sweep_samples(test, fixed), t, **sweep_kwargs)
+        errors = [np.max(np.abs(surrogate._expand(x) - exact[i])) for i, x in enumerate(test)]
+        surrogate.error_bound = float(np.max(errors))
+        return surrogate
+
+    def save(self, path):
+        """Writes the surrogate to an .npz file."""
+        np.savez(path, coefficients=self.coefficients, mean=self.mean, basis=self.basis, t=self.t,
+                 log_axes=self.log_axes, error_bound=self.error_bound, fixed=json.dumps(self.fixed),
+                 **{'axis_{}'.format(i): axis for i, axis in enumerate(self.axes)})
+
+    @classmethod
+    def load(cls, path):
+        """Reads a surrogate written by `save`."""
+        with np.load(path) as data:
+            axes = [data['axis_{}'.format(i)] for i in range(len(AXES))]
+            return cls(axes, data['log_axes'], data['coefficients'], data['mean'], data['basis'], data['t'],
+                       json.loads(str(data['fixed'])), data['error_bound'])
+
+    def coordinates(self, params):
+        """Maps scenario settings onto the surrogate's axes.
+
+        Returns
+        ----------
+        ndarray or None
+            The point in the AXES box, or None if the surrogate doesn't cover the scenario
+
+        Raises
+        ----------
+        ValueError
+            If params has a key that isn't a scenario setting
+        """
+        p = scenario_params(params)
+        if p['R0_schedule'] is not None or p['days'] is None:
+            return None
+        if any(float(p[name]) != value for name, value in self.fixed.items()):
+            return None
+        policies = [make_policy(spec) for spec in p['policies']]
+        x0, R_0_end = fold_policies(float(p['R_0_start']), float(p['x0']), float(p['R_0_end']), policies)
+        # policies at other onsets add stages the surrogate has no axis for
+        if len(x0) != 1 or x0[0] != self.fixed['x0']:
+            return None
+        x = np.array([float(p['mortality_rate']), float(p['contagious_period']), float(p['incubation_time']),
+                      float(p['infection_to_death']), R_0_end[0]])
+        inside = all(axis[0] <= value <= axis[-1] for axis, value in zip(self.axes, x))
+        return x if inside else None
+
+    def _expand(self, x):
+        """Interpolates the coefficients at point x and returns the (len(t), 5) trajectory."""
+        first = np.empty(len(self.axes), dtype=int)
+        weights = np.ones(1)
+        for i, (coords, value, log) in enumerate(zip(self._coords, x, self.log_axes)):
+            first[i], w = _cubic_weights(coords, math.log(value) if log else value)
+            weights = np.outer(weights, w).ravel()
+        c = weights @ self._flat[(first + self._stencil) @ self._strides]
+        return (self.mean + c @ self.basis).reshape(len(self.t), 5) * self.fixed['population']
+
+    def predict(self, params, cache=None):
+        """Answers a scenario from the surrogate, or exactly if it isn't covered.
+
+        Parameters
+        ----------
+        params : dict
+            Scenario settings, as for `seird.simulate`
+
+        cache : seird_cache.ScenarioCache
+            Passed on to `seird.simulate` on a fallback
+
+        Returns
+        ----------
+        dict
+            As from `seird.simulate`, plus 'error_bound': the largest deviation (in
+            people) seen on held-out scenarios, or 0.0 for an exact answer
+        """
+        x = self.coordinates(params)
+        if x is None:
+            return dict(simulate(params, cache=cache), error_bound=0.0)
+        S, E, I, R, D = self._expand(x).T
+        R0 = logistic_R_0(self.t, self.fixed['R_0_start'], self.fixed['k'], self.fixed['x0'], x[4])
+        return {'t': self.t, 'S': S, 'E': E, 'I': I, 'R': R, 'D': D, 'R0': R0, 'error_bound': self.error_bound}
@@ -0,0 +1,218 @@
+# Parallel parameter sweeps over the batch SEIRD solver
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from seird_batch import batch_odeint
+from seird_profile import active, phase, profiled
+
+# names of the batch solver parameters, in the order batch_odeint takes them
+PARAM_NAMES = ('N', 'gamma', 'delta', 'alpha', 'rho', 'R_0_start', 'k', 'x0', 'R_0_end')
+
+# default values for any parameter a sweep leaves out, matching the dashboard defaults
+DEFAULTS = {
+    'N': 1000000.0,
+    'gamma': 1.0 / 4,
+    'delta': 1.0 / 5,
+    'alpha': 0.3,
+    'rho': 1.0 / 9,
+    'R_0_start': 6.0,
+    'k': 1.0,
+    'x0': 30.0,
+    'R_0_end': 6.0,
+}
+
+def grid(**axes):
+    """Builds the full cartesian product of the given parameter values.
+
+    Parameters
+    ----------
+    **axes : sequence
+        Values to try for each parameter, e.g. grid(alpha=[0.1, 0.2], R_0_end=[2, 3, 4])
+
+    Returns
+    ----------
+    dict
+        Parameter name -> ndarray of shape (n_scenarios,)
+    """
+    names = list(axes)
+    combos = np.array(list(itertools.product(*[axes[name] for name in names])), dtype=float)
+    return {name: combos[:, i] for i, name in enumerate(names)}
+
+def latin_hypercube(bounds, n, seed=None):
+    """Draws a Latin-hypercube sample: every parameter range is cut into n equal strata
+    and each stratum is used exactly once.
+
+    Parameters
+    ----------
+    bounds : dict
+        Parameter name -> (low, high)
+
+    n : int
+        Number of scenarios
+
+    seed : int
+        Seed for np.random.default_rng
+
+    Returns
+    ----------
+    dict
+        Parameter name -> ndarray of shape (n,)
+    """
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for name, (low, high) in bounds.items():
+        u = (rng.permutation(n) + rng.random(n)) / n
+        samples[name] = low + u * (high - low)
+    return samples
+
+def _fill_defaults(samples):
+    """Returns a (n_params, n_scenarios) matrix with defaults for any missing parameter."""
+    unknown = set(samples) - set(PARAM_NAMES)
+    if unknown:
+        raise ValueError('Unknown sweep parameter(s): {}'.format(', '.join(sorted(unknown))))
+    n_scenarios = len(next(iter(samples.values())))
+    return np.array([np.broadcast_to(np.asarray(samples.get(name, DEFAULTS[name]), dtype=float), (n_scenarios,))
+                     for name in PARAM_NAMES])
+
+def _run_chunk(params, t, steps_per_day, profile=False):
+    """Integrates one chunk of scenarios; runs inside a worker process.
+
+    With `profile`, the chunk is instrumented in the worker and its counters and
+    solver statistics are returned alongside the result, for the parent to merge.
+    """
+    N = params[0]
+    y0 = np.zeros((len(N), 5))
+    y0[:, 0] = N - 1
+    y0[:, 1] = 1
+    if not profile:
+        return batch_odeint(y0, t, *params, steps_per_day=steps_per_day)
+    with profiled() as chunk_profile:
+        ret = batch_odeint(y0, t, *params, steps_per_day=steps_per_day)
+    return ret, chunk_profile.counters, chunk_profile.solvers
+
+def _chunk_path(checkpoint_dir, index):
+    return os.path.join(checkpoint_dir, 'chunk_{:06d}.npy'.format(index))
+
+def sweep(samples, t, chunk_size=1000, workers=None, checkpoint_dir=None, progress=None, steps_per_day=10, out=None):
+    """Runs every scenario in `samples` through the batch solver, spread over a process pool.
+
+    The scenarios are split into chunks of `chunk_size`. Each chunk is integrated in
+    one vectorized `batch_odeint` call on a worker, and its result is copied into a
+    preallocated array as soon as it finishes. If `checkpoint_dir` is given, every
+    finished chunk is also saved there, and a rerun of the same sweep only integrates
+    the chunks that are still missing.
+
+    Parameters
+    ----------
+    samples : dict
+        Parameter name -> ndarray of shape (n_scenarios,), e.g. from `grid` or
+        `latin_hypercube`. Parameters left out use DEFAULTS. Every scenario starts
+        from S, E, I, R, D = N-1, 1, 0, 0, 0.
+
+    t : ndarray
+        Grid of time points (in days)
+
+    chunk_size : int
+        Number of scenarios per work unit
+
+    workers : int
+        Number of worker processes (default: os.cpu_count()). With 1 worker the
+        chunks run in this process.
+
+    checkpoint_dir : str
+        Directory for finished chunks, used to resume after a crash
+
+    progress : function
+        Called as progress(done_chunks, total_chunks) after each chunk finishes
+
+    steps_per_day : int
+        Minimum number of RK4 sub-steps per day
+
+    out : ndarray or seird_store.ResultStore
+        Optional preallocated (n_scenarios, len(t), 5) array, or an on-disk store
+        created for the same samples, to write the results to
+
+    Returns
+    ----------
+    ret : ndarray or seird_store.ResultStore
+        (n_scenarios, len(t), 5) array of S, E, I, R, D values (`out`, if given)
+    """
+    params = _fill_defaults(samples)
+    t = np.asarray(t, dtype=float)
+    n_scenarios = params.shape[1]
+    if out is None:
+        out = np.empty((n_scenarios, len(t), 5))
+    starts = range(0, n_scenarios, chunk_size)
+    total = len(starts)
+
+    # pick up chunks left behind by an earlier run of the same sweep
+    pending = list(enumerate(starts))
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        manifest = os.path.join(checkpoint_dir, 'sweep.npz')
+        if os.path.exists(manifest):
+            previous = np.load(manifest)
+            if not (previous['chunk_size'] == chunk_size and np.array_equal(previous['params'], params)
+                    and np.array_equal(previous['t'], t)):
+                raise ValueError('{} holds checkpoints from a different sweep'.format(checkpoint_dir))
+        else:
+            np.savez(manifest, params=params, t=t, chunk_size=chunk_size)
+        remaining = []
+        for index, start in pending:
+            path = _chunk_path(checkpoint_dir, index)
+            if os.path.exists(path):
+                out[start:start + chunk_size] = np.load(path)
+            else:
+                remaining.append((index, start))
+        pending = remaining
+
+    done = total - len(pending)
+    if progress is not None and done:
+        progress(done, total)
+
+    def finish(index, start, result):
+        nonlocal done
+        out[start:start + chunk_size] = result
+        if checkpoint_dir is not None:
+            # write then rename, so a crash never leaves half a chunk behind
+            path = _chunk_path(checkpoint_dir, index)
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, result)
+            os.replace(path + '.tmp', path)
+        done += 1
+        if progress is not None:
+            progress(done, total)
+
+    if workers == 1:
+        with phase('integrate'):
+            for index, start in pending:
+                finish(index, start, _run_chunk(params[:, start:start + chunk_size], t, steps_per_day))
+        return out
+
+    # worker processes don't see this process's profile, so they send their statistics back
+    profile = active()
+    # keep only a couple of chunks per worker in flight, so finished results don't pile up in RAM
+    max_in_flight = 2 * (workers or os.cpu_count() or 1)
+    pending = iter(pending)
+    with phase('integrate'), ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        while True:
+            for index, start in pending:
+                futures[executor.submit(_run_chunk, params[:, start:start + chunk_size], t, steps_per_day,
+                                        profile is not None)] = (index, start)
+                if len(futures) >= max_in_flight:
+                    break
+            if not futures:
+                break
+            done_futures, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                index, start = futures.pop(future)
+                result = future.result()
+                if profile is not None:
+                    result, counters, solvers = result
+                    for name, n in counters.items():
+                        profile.count(name, n)
+                    profile.solvers.extend(solvers)
+                finish(index, start, result)
+    return out
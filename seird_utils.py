@@ -1,11 +1,32 @@
 # Utility functions for SEIRD model
+from collections import namedtuple
+import math
 from scipy.integrate import odeint
 import numpy as np
 
+# Numba is optional; without it `rhs` and `jac` run as plain Python
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
 # global variables
 D = 4.0 # CONTAGIOUS PERIOD; DEFAULT: infections lasts four days
 gamma = 1.0 / D # Default value
 
+# policies a user can implement; each lowers R0 by `decrement`, phased in around day `onset`
+Policy = namedtuple('Policy', ['name', 'decrement', 'onset'])
+POLICIES = {
+    'businesses': Policy('Close non-essential businesses', 0.5, 30),
+    'schools': Policy('Close schools and universities', 0.1, 30),
+    'quarantine': Policy('Stay at home orders (quarantine)', 0.4, 30),
+    'testing': Policy('Aggressive testing', 0.5, 30),
+    'travel': Policy('Travel ban', 0.2, 30),
+}
+
 def deriv(y, t, N, beta, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end):
     """Calculates the end result for ordinary differential equations for SEIRD values.
     
@@ -20,8 +41,9 @@ def deriv(y, t, N, beta, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end):
     N : int
         Population
 
-    beta : float
-        Expected amount of people an infected person infects each day
+    beta : function
+        Expected amount of people an infected person infects each day, called as
+        beta(t, R_0_start, k, x0, R_0_end, gamma)
 
     gamma : float
         The proportion of infected recovering each day (γ = 1/D)
@@ -65,8 +87,9 @@ def deriv(y, t, N, beta, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end):
         Derivative of D with respect to time
     """
     S, E, I, R, D = y
-    dSdt = -beta(t, R_0_start, k, x0, R_0_end) * S * I / N
-    dEdt = beta(t, R_0_start, k, x0, R_0_end) * S * I / N - delta * E
+    infections = beta(t, R_0_start, k, x0, R_0_end, gamma) * S * I / N
+    dSdt = -infections
+    dEdt = infections - delta * E
     dIdt = delta * E - (1 - alpha) * gamma * I - alpha * rho * I
     dRdt = (1 - alpha) * gamma * I
     dDdt = alpha * rho * I
@@ -98,7 +121,7 @@ def logistic_R_0(t, R_0_start, k, x0, R_0_end):
     """
     return (R_0_start-R_0_end) / (1 + np.exp(-k*(-t+x0))) + R_0_end
 
-def beta(t, R_0_start, k, x0, R_0_end):
+def beta(t, R_0_start, k, x0, R_0_end, gamma=gamma):
     """The expected amount of people an infected person infects each day
     
     Parameters
@@ -118,6 +141,9 @@ def beta(t, R_0_start, k, x0, R_0_end):
     R_0_end : float
         Value for R0 on last day
 
+    gamma : float
+        The proportion of infected recovering each day (γ = 1/D)
+
     Returns 
     --------
     Logistic value of R0 at time step t, with gamma applied. 
@@ -145,4 +171,208 @@ def less_than_zero(value, decrement):
     if value - decrement < 0:
         return 0
     else:
-        return value-decrement
\ No newline at end of file
+        return value-decrement
+
+def fold_policies(R_0_start, x0, R_0_end, policies):
+    """ Folds a logistic R0 curve and a set of policies into one staged R0 schedule.
+
+    Policies sharing an onset day are merged into a single stage, so the schedule only
+    grows with the number of distinct onset days. Each stage lowers R0 with
+    `less_than_zero`, exactly as applying the policies one after another would.
+
+    Parameters
+    ----------
+    R_0_start : float
+        Value for R0 on first day
+
+    x0 : float
+        x-value of the inflection point of the base curve
+
+    R_0_end : float
+        Value for R0 on last day of the base curve, before any policy
+
+    policies : iterable of Policy
+        Policies to implement
+
+    Returns
+    ----------
+    x0 : ndarray
+        Sorted inflection points (onset days) of the stages
+
+    R_0_end : ndarray
+        Value for R0 reached after each stage
+    """
+    decrements = {x0: R_0_start - R_0_end}
+    for policy in policies:
+        decrements.setdefault(policy.onset, 0)
+        decrements[policy.onset] += policy.decrement
+    onsets = sorted(decrements)
+    levels = []
+    value = R_0_start
+    for onset in onsets:
+        value = less_than_zero(value, decrements[onset])
+        levels.append(value)
+    return np.array(onsets, dtype=float), np.array(levels, dtype=float)
+
+def staged_R_0(t, R_0_start, k, x0, R_0_end):
+    """Generalizes `logistic_R_0` to several inflection points, one logistic step per stage.
+
+    Parameters
+    ----------
+    t : int or ndarray
+        Time (days)
+
+    R_0_start : float
+        Value for R0 on first day
+
+    k : float
+        Factor that lets us vary how quickly R_0 declines
+
+    x0 : ndarray
+        x-values of the inflection points, as returned by `fold_policies`
+
+    R_0_end : ndarray
+        Value for R0 reached after each inflection point, as returned by `fold_policies`
+
+    Returns
+    --------
+    Value of R0 at time step(s) t
+    """
+    drops = -np.diff(R_0_end, prepend=R_0_start)
+    return R_0_start - np.sum(drops / (1 + np.exp(-k*np.subtract.outer(t, x0))), axis=-1)
+
+@njit(cache=True)
+def _schedule_beta(t, gamma, R_0_start, k, x0, R_0_end):
+    """Evaluates `staged_R_0` * gamma for a scalar t without any temporary arrays."""
+    R_0 = R_0_start
+    previous = R_0_start
+    for i in range(len(x0)):
+        # numerically stable logistic, so large k or t never overflows math.exp
+        z = k * (t - x0[i])
+        if z >= 0:
+            step = 1.0 / (1.0 + math.exp(-z))
+        else:
+            step = math.exp(z) / (1.0 + math.exp(z))
+        R_0 -= (previous - R_0_end[i]) * step
+        previous = R_0_end[i]
+    return R_0 * gamma
+
+@njit(cache=True)
+def _derivatives(y, b, delta, alpha, rho, gamma):
+    """SEIRD derivatives for a given transmission rate per person, b = beta / N."""
+    S, E, I = y[0], y[1], y[2]
+    infections = b * S * I
+    dydt = np.empty(5)
+    dydt[0] = -infections
+    dydt[1] = infections - delta * E
+    dydt[2] = delta * E - (1 - alpha) * gamma * I - alpha * rho * I
+    dydt[3] = (1 - alpha) * gamma * I
+    dydt[4] = alpha * rho * I
+    return dydt
+
+@njit(cache=True)
+def _jacobian(y, b, delta, alpha, rho, gamma):
+    """Jacobian of `_derivatives` with respect to y."""
+    S, I = y[0], y[2]
+    J = np.zeros((5, 5))
+    J[0, 0] = -b * I
+    J[0, 2] = -b * S
+    J[1, 0] = b * I
+    J[1, 1] = -delta
+    J[1, 2] = b * S
+    J[2, 1] = delta
+    J[2, 2] = -(1 - alpha) * gamma - alpha * rho
+    J[3, 2] = (1 - alpha) * gamma
+    J[4, 2] = alpha * rho
+    return J
+
+@njit(cache=True)
+def rhs(y, t, N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end):
+    """Explicit-parameter version of `deriv`, compiled with Numba when it is installed.
+
+    Transmission uses the gamma passed in (not the module default), and the R0
+    schedule is evaluated once per call.
+
+    Parameters
+    ----------
+    y : ndarray
+        Current S, E, I, R, D values
+
+    t : float
+        Time (days)
+
+    N, gamma, delta, alpha, rho, R_0_start, k : float
+        See `deriv`
+
+    x0 : ndarray
+        x-values of the inflection points, as returned by `fold_policies`
+
+    R_0_end : ndarray
+        Value for R0 reached after each inflection point, as returned by `fold_policies`
+
+    Returns
+    ----------
+    dydt : ndarray
+        Derivatives of S, E, I, R, D with respect to time
+    """
+    b = _schedule_beta(t, gamma, R_0_start, k, x0, R_0_end) / N
+    return _derivatives(y, b, delta, alpha, rho, gamma)
+
+@njit(cache=True)
+def jac(y, t, N, gamma, delta, alpha, rho, R_0_start, k, x0, R_0_end):
+    """Analytic Jacobian of `rhs` with respect to y, for use as `odeint(..., Dfun=jac)`.
+
+    Parameters
+    ----------
+    Same as `rhs`
+
+    Returns
+    ----------
+    J : ndarray
+        (5, 5) matrix with J[i, j] = d(dy_i/dt) / dy_j
+    """
+    b = _schedule_beta(t, gamma, R_0_start, k, x0, R_0_end) / N
+    return _jacobian(y, b, delta, alpha, rho, gamma)
+
+@njit(cache=True)
+def table_R_0(t, t0, dt, R0_table):
+    """Linear interpolation in an R0 table on a uniform grid, held constant past either end."""
+    x = (t - t0) / dt
+    if x <= 0:
+        return R0_table[0]
+    i = int(x)
+    if i >= len(R0_table) - 1:
+        return R0_table[-1]
+    return R0_table[i] + (R0_table[i + 1] - R0_table[i]) * (x - i)
+
+@njit(cache=True)
+def table_rhs(y, t, N, gamma, delta, alpha, rho, t0, dt, R0_table):
+    """Version of `rhs` that reads R0 from a precomputed table (see `seird_schedules`).
+
+    Parameters
+    ----------
+    y : ndarray
+        Current S, E, I, R, D values
+
+    t : float
+        Time (days)
+
+    N, gamma, delta, alpha, rho : float
+        See `deriv`
+
+    t0, dt, R0_table : float, float, ndarray
+        R0 on the uniform grid t0, t0 + dt, ..., as returned by `R0Schedule.tabulate`
+
+    Returns
+    ----------
+    dydt : ndarray
+        Derivatives of S, E, I, R, D with respect to time
+    """
+    b = table_R_0(t, t0, dt, R0_table) * gamma / N
+    return _derivatives(y, b, delta, alpha, rho, gamma)
+
+@njit(cache=True)
+def table_jac(y, t, N, gamma, delta, alpha, rho, t0, dt, R0_table):
+    """Analytic Jacobian of `table_rhs` with respect to y, for use as `odeint(..., Dfun=table_jac)`."""
+    b = table_R_0(t, t0, dt, R0_table) * gamma / N
+    return _jacobian(y, b, delta, alpha, rho, gamma)